@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Accommodation, RoomType, RoomBooking, GuestService, FeedbackReview
+from .models import Accommodation, RoomType, RoomBooking, GuestService, FeedbackReview, RoomNightInventory
 
 @admin.register(Accommodation)
 class AccommodationAdmin(admin.ModelAdmin):
@@ -15,6 +15,11 @@ class RoomBookingAdmin(admin.ModelAdmin):
     list_display = ('accommodation_id', 'room_type_id', 'user_id', 'check_in_date', 'check_out_date', 'total_price', 'booking_status', 'payment_status')
     list_filter = ('booking_status', 'payment_status')
 
+@admin.register(RoomNightInventory)
+class RoomNightInventoryAdmin(admin.ModelAdmin):
+    list_display = ('accommodation_id', 'night', 'booked_rooms')
+    list_filter = ('night',)
+
 @admin.register(GuestService)
 class GuestServiceAdmin(admin.ModelAdmin):
     list_display = ('accommodation_id', 'service_name', 'price', 'availability_hours')
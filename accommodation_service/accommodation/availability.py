@@ -0,0 +1,84 @@
+import logging
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Exists, ExpressionWrapper, F, IntegerField, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Accommodation, RoomBooking, RoomNightInventory, RoomType, stay_nights
+
+logger = logging.getLogger(__name__)
+
+
+def bookable_room_types(guests=1):
+    return RoomType.objects.filter(availability=True, max_occupancy__gte=guests).order_by('price_per_night', 'id')
+
+
+def available_accommodations(check_in, check_out, guests=1, queryset=None):
+    """
+    Accommodations with at least one free room on every night of [check_in, check_out)
+    and an available room type for ``guests``, annotated with ``available_rooms``.
+    Each accommodation reads its night range from the (accommodation, night) inventory index,
+    so the cost does not grow with the number of bookings. Suitable room types are
+    prefetched into ``bookable_types``, cheapest first.
+    """
+    queryset = queryset if queryset is not None else Accommodation.objects.all()
+    # 区间内占用最多的那一晚决定还剩几间房
+    peak_booked = RoomNightInventory.objects.filter(
+        accommodation_id=OuterRef('pk'), night__gte=check_in, night__lt=check_out,
+    ).order_by('-booked_rooms').values('booked_rooms')[:1]
+    suitable_types = Accommodation.types.through.objects.filter(
+        accommodation_id=OuterRef('pk'), roomtype__availability=True, roomtype__max_occupancy__gte=guests)
+
+    return queryset.annotate(
+        booked_rooms=Coalesce(Subquery(peak_booked), Value(0), output_field=IntegerField()),
+    ).annotate(
+        available_rooms=ExpressionWrapper(F('total_rooms') - F('booked_rooms'), output_field=IntegerField()),
+    ).filter(
+        Exists(suitable_types), available_rooms__gt=0,
+    ).prefetch_related(
+        Prefetch('types', queryset=bookable_room_types(guests), to_attr='bookable_types'),
+    ).order_by('id')
+
+
+def rebuild_inventory():
+    """
+    Recompute the whole night inventory from the bookings; used to backfill and to repair drift.
+    Returns the number of inventory rows written.
+    """
+    booked = Counter()
+    bookings = RoomBooking.objects.values_list('accommodation_id', 'check_in_date', 'check_out_date')
+    for accommodation_id, check_in, check_out in bookings.iterator():
+        for night in stay_nights(check_in, check_out):
+            booked[accommodation_id, night] += 1
+
+    with transaction.atomic():
+        RoomNightInventory.objects.all().delete()
+        RoomNightInventory.objects.bulk_create(
+            [RoomNightInventory(accommodation_id_id=accommodation_id, night=night, booked_rooms=count)
+             for (accommodation_id, night), count in booked.items()],
+            batch_size=1000,
+        )
+    return len(booked)
+
+
+def retry_on_lock_conflict(func, retries=None, backoff=None):
+    """
+    Call ``func`` and retry it when the database gives up on a lock: "database is locked" on SQLite,
+    a deadlock or serialization failure on PostgreSQL. Waits grow exponentially with jitter.
+    Inside an outer transaction the failed transaction cannot be reused, so nothing is retried.
+    """
+    retries = retries if retries is not None else getattr(settings, 'ROOM_BOOKING_LOCK_RETRIES', 5)
+    backoff = backoff if backoff is not None else getattr(settings, 'ROOM_BOOKING_RETRY_BACKOFF', 0.05)
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except OperationalError as e:
+            if attempt == retries or transaction.get_connection().in_atomic_block:
+                raise
+            delay = backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            logger.warning(f"Room booking hit a lock conflict ({e}), retry {attempt + 1}/{retries} in {delay:.3f}s")
+            time.sleep(delay)
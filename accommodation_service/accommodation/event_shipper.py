@@ -0,0 +1,341 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from . import http_client
+from .circuit_breaker import get_breaker
+from .event_spool import EventSpool
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP_NEWEST = 'drop_newest'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_POLICIES = (OVERFLOW_DROP_NEWEST, OVERFLOW_DROP_OLDEST, OVERFLOW_BLOCK)
+
+
+class EventLogShipper:
+    """
+    Ships event logs to the log API from a background worker thread.
+
+    The request thread only puts operations on a bounded in-process queue. A daemon
+    worker drains the queue in batches (up to ``batch_size`` items, or whatever has
+    arrived within ``flush_interval`` seconds) and sends them to the log API, so the
+    latency of a request never depends on the log API.
+
+    Complete ``record`` operations of a batch are sent together in one request to the
+    bulk endpoint. The legacy ``create``/``update`` pair is processed strictly in FIFO
+    order by the single worker, so an ``update`` always runs after the ``create`` of
+    the same event and can reuse the ``id`` the create stored on their shared ``handle``.
+
+    With a ``spool``, records that cannot be delivered are written to disk instead of
+    being dropped, and the worker replays them to the bulk endpoint every
+    ``replay_interval`` seconds once the logs_api breaker lets requests through again.
+    """
+
+    def __init__(self, logs_api_url, queue_size=10000, batch_size=100, flush_interval=1.0,
+                 overflow_policy=OVERFLOW_DROP_NEWEST, spool=None, replay_interval=10.0):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.logs_api_url = logs_api_url
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.spool = spool
+        self.replay_interval = replay_interval
+        self._last_replay = 0.0
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.undelivered = 0
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+    def enqueue(self, operation, event_data, handle=None):
+        """
+        Put an operation (``record``, ``create`` or ``update``) on the queue without touching the network.
+        ``event_data`` should be a snapshot the caller no longer mutates; ``handle`` is a dict
+        shared by the operations of one event, used to pass the created log ID along.
+        Returns False if the event had to be dropped because the queue is full.
+        """
+        self._ensure_worker()
+        item = (operation, event_data, handle if handle is not None else {})
+        try:
+            if self.overflow_policy == OVERFLOW_BLOCK:
+                # 最多等待一个 flush 周期，避免请求线程被无限阻塞
+                self.queue.put(item, timeout=self.flush_interval)
+            else:
+                self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self._record_drop()
+                self.queue.put_nowait(item)
+                return True
+            except (queue.Empty, queue.Full):
+                pass
+
+        self._record_drop()
+        return False
+
+    def flush(self, timeout=5.0):
+        """
+        Wait until the queue has been drained, or until ``timeout`` seconds have passed.
+        """
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            if not self._worker_alive():
+                break
+            time.sleep(0.05)
+
+    def _record_drop(self):
+        with self._lock:
+            self.dropped += 1
+            dropped = self.dropped
+        if dropped == 1 or dropped % 1000 == 0:
+            logger.warning(f"Event log queue is full, {dropped} events dropped so far")
+
+    def _worker_alive(self):
+        return self._worker is not None and self._worker.is_alive() and self._worker_pid == os.getpid()
+
+    def _ensure_worker(self):
+        # gunicorn 在 fork 之后线程不会被继承，因此按进程懒启动 worker
+        if self._worker_alive():
+            return
+        with self._lock:
+            if self._worker_alive():
+                return
+            self._worker_pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name='event-log-shipper', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            self._maybe_replay_spool()
+            if not batch:
+                continue
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                logger.error(f"Error shipping event log batch: {str(e)}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _collect_batch(self):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send_batch(self, batch):
+        # 日志 API 熔断时不发送，整批交给降级策略处理
+        breaker = get_breaker('logs_api')
+        if not breaker.allow_request():
+            self._handle_undelivered([event_data for operation, event_data, _ in batch if operation == 'record'],
+                                     len(batch))
+            return
+
+        delivered = True
+        records = [event_data for operation, event_data, _ in batch if operation == 'record']
+        try:
+            if records:
+                delivered = self._send_records(records) and delivered
+
+            for operation, event_data, handle in batch:
+                if operation == 'record':
+                    continue
+                elif operation == 'create':
+                    delivered = self._send_create(event_data, handle) and delivered
+                elif operation == 'update':
+                    delivered = self._send_update(event_data, handle) and delivered
+                else:
+                    logger.error(f"Unknown event log operation: {operation}")
+        except Exception:
+            # 意外异常也要给熔断器一个结果，否则半开状态的试探名额一直被占用
+            breaker.record_failure()
+            raise
+
+        if delivered:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def _handle_undelivered(self, records, count):
+        """
+        日志 API 不可用时的降级处理：有 spool 时把完整记录写入磁盘，其余操作丢弃。
+        create/update 依赖日志 ID，无法离线回放，只能丢弃
+        """
+        if self.spool is not None and records:
+            try:
+                self.spool.append(records)
+                count -= len(records)
+                logger.warning(f"Log API unavailable, spooled {len(records)} event logs to disk")
+            except OSError as e:
+                logger.error(f"Error writing event logs to spool: {str(e)}")
+        if count <= 0:
+            return
+        with self._lock:
+            self.undelivered += count
+        logger.warning(f"Log API unavailable, dropped {count} event log operations")
+
+    def _maybe_replay_spool(self):
+        """
+        每隔 replay_interval 秒把磁盘上的日志回放到 bulk 接口，熔断期间不回放
+        """
+        if self.spool is None or time.monotonic() - self._last_replay < self.replay_interval:
+            return
+        self._last_replay = time.monotonic()
+        if not self.spool.has_pending():
+            return
+        breaker = get_breaker('logs_api')
+        if not breaker.allow_request():
+            return
+        try:
+            replayed = self.spool.drain(lambda records: self._replay_records(records, breaker),
+                                        chunk_size=self.batch_size)
+        except Exception as e:
+            logger.error(f"Error replaying event log spool: {str(e)}")
+            breaker.record_failure()
+            return
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled event logs to API")
+
+    def _replay_records(self, records, breaker):
+        """
+        回放一批磁盘日志；失败时保留在磁盘上，等下次回放
+        """
+        try:
+            response = http_client.post(f"{self.logs_api_url}/api/customUser/event-logs/bulk/", json=records)
+        except Exception as e:
+            logger.error(f"Error replaying log batch to API: {str(e)}")
+            breaker.record_failure()
+            return False
+        if response.status_code >= 500:
+            breaker.record_failure()
+            return False
+        if response.status_code != 201:
+            # 4xx 说明数据本身有问题，重放也不会成功，直接放弃
+            logger.error(f"Spooled log batch rejected by API: {response.status_code} {response.text}")
+        breaker.record_success()
+        return True
+
+    def _send_records(self, records):
+        """
+        通过 bulk 接口一次性发送一批完整的日志记录。
+        返回 False 表示日志 API 不可用（网络错误或 5xx）
+        """
+        try:
+            response = http_client.post(f"{self.logs_api_url}/api/customUser/event-logs/bulk/", json=records)
+        except Exception as e:
+            logger.error(f"Error sending log batch to API: {str(e)}")
+            self._handle_undelivered(records, len(records))
+            return False
+        if response.status_code == 201:
+            logger.info(f"{len(records)} logs successfully recorded to API")
+        else:
+            logger.error(f"Failed to record log batch to API: {response.status_code} {response.text}")
+        if response.status_code >= 500:
+            self._handle_undelivered(records, len(records))
+            return False
+        return True
+
+    def _send_create(self, event_data, handle):
+        """
+        发送日志到日志 API，并把返回的 ID 保存到 handle 中
+        """
+        try:
+            response = http_client.post(f"{self.logs_api_url}/api/customUser/event-logs/", json=event_data)
+        except Exception as e:
+            logger.error(f"Error sending log to API: {str(e)}")
+            return False
+        # 200 表示该 event_id 已经写入过（重试），同样视为成功
+        if response.status_code in (200, 201):
+            log_id = response.json().get('data', {}).get('id')
+            if log_id:
+                handle['id'] = log_id
+                logger.info(f"Log successfully recorded to API with ID: {log_id}")
+        else:
+            logger.error(f"Failed to record log to API: {response.status_code} {response.text}")
+        return response.status_code < 500
+
+    def _send_update(self, event_data, handle):
+        """
+        更新日志到日志 API
+        """
+        log_id = handle.get('id')
+        if not log_id:
+            logger.error("No log ID found in event data. Cannot update log.")
+            return True
+        try:
+            response = http_client.patch(f"{self.logs_api_url}/api/customUser/event-logs/{log_id}/", json=event_data)
+        except Exception as e:
+            logger.error(f"Error updating log to API: {str(e)}")
+            return False
+        if response.status_code == 200:
+            logger.info(f"Log successfully updated to API with ID: {log_id}")
+        else:
+            logger.error(f"Failed to update log to API: {response.status_code} {response.text}")
+        return response.status_code < 500
+
+
+def _build_spool():
+    if getattr(settings, 'LOGS_BREAKER_FALLBACK', 'drop') != 'spool':
+        return None
+    try:
+        return EventSpool(
+            settings.EVENT_LOG_SPOOL_DIR,
+            segment_max_bytes=getattr(settings, 'EVENT_LOG_SPOOL_SEGMENT_BYTES', 4 * 1024 * 1024),
+            max_total_bytes=getattr(settings, 'EVENT_LOG_SPOOL_MAX_BYTES', 256 * 1024 * 1024),
+            fsync=getattr(settings, 'EVENT_LOG_SPOOL_FSYNC', True),
+        )
+    except OSError as e:
+        logger.error(f"Event log spool unavailable, undelivered logs will be dropped: {str(e)}")
+        return None
+
+
+_shipper = None
+_shipper_lock = threading.Lock()
+
+
+def get_shipper():
+    """
+    Return the process-wide shipper, creating it from settings on first use.
+    """
+    global _shipper
+    if _shipper is None:
+        with _shipper_lock:
+            if _shipper is None:
+                _shipper = EventLogShipper(
+                    logs_api_url=settings.LOGS_API_URL,
+                    queue_size=getattr(settings, 'EVENT_LOG_QUEUE_SIZE', 10000),
+                    batch_size=getattr(settings, 'EVENT_LOG_BATCH_SIZE', 100),
+                    flush_interval=getattr(settings, 'EVENT_LOG_FLUSH_INTERVAL', 1.0),
+                    overflow_policy=getattr(settings, 'EVENT_LOG_OVERFLOW_POLICY', OVERFLOW_DROP_NEWEST),
+                    spool=_build_spool(),
+                    replay_interval=getattr(settings, 'EVENT_LOG_SPOOL_REPLAY_INTERVAL', 10.0),
+                )
+                atexit.register(_shipper.flush)
+    return _shipper
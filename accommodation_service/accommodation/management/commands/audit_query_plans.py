@@ -0,0 +1,89 @@
+import re
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+APP_LABEL = __name__.split('.')[0]
+URL_KWARG_PATTERN = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+
+
+class Command(BaseCommand):
+    help = ('Run EXPLAIN for the queries issued by every registered viewset list endpoint and GET '
+            'list action, as seen by a regular (non-staff) user, and flag full-table scans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, default=1, help='ID of the user the requests are made as')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error when a filtered query still scans a whole table')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f"EXPLAIN parsing is not implemented for {connection.vendor}")
+
+        router = import_module(f'{APP_LABEL}.urls').router
+        user = get_user_model()(id=options['user_id'], is_staff=False, is_superuser=False)
+        problems = 0
+
+        for prefix, viewset, _ in router.registry:
+            for label, queries in self.capture_endpoints(prefix, viewset, user):
+                self.stdout.write(self.style.MIGRATE_HEADING(f"GET {label}"))
+                for sql in queries:
+                    scans = self.full_scans(sql)
+                    filtered = ' WHERE ' in sql.upper()
+                    if scans and filtered:
+                        problems += 1
+                        self.stdout.write(self.style.ERROR(f"  FULL SCAN of {', '.join(scans)}: {sql}"))
+                    elif scans:
+                        self.stdout.write(f"  full scan of {', '.join(scans)} (unfiltered list): {sql}")
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f"  indexed: {sql}"))
+
+        if problems and options['fail_on_scan']:
+            raise CommandError(f"{problems} filtered queries scan a whole table")
+        self.stdout.write(f"{problems} filtered queries scan a whole table")
+
+    def capture_endpoints(self, prefix, viewset, user):
+        """
+        Call the list route and every detail=False GET action of a viewset and collect its SELECTs.
+        Everything runs in a transaction that is rolled back.
+        """
+        endpoints = [('list', f'{prefix}/', {})]
+        for extra in viewset.get_extra_actions():
+            if extra.detail or 'get' not in extra.mapping:
+                continue
+            kwargs = {name: '1' for name in URL_KWARG_PATTERN.findall(extra.url_path)}
+            url_path = URL_KWARG_PATTERN.sub(r'<\1>', extra.url_path)
+            endpoints.append((extra.mapping['get'], f'{prefix}/{url_path}', kwargs))
+
+        factory = APIRequestFactory()
+        for action, label, kwargs in endpoints:
+            request = factory.get(f'/{label}')
+            force_authenticate(request, user=user)
+            view = viewset.as_view({'get': action})
+            with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+                try:
+                    view(request, **kwargs)
+                except Exception as e:
+                    self.stderr.write(f"GET {label} failed: {e}")
+                transaction.set_rollback(True)
+            yield label, [query['sql'] for query in captured.captured_queries
+                          if query['sql'].lstrip().upper().startswith('SELECT')]
+
+    def full_scans(self, sql):
+        """
+        Tables the plan reads completely: ``SCAN <table>`` without an index on SQLite,
+        ``Seq Scan on <table>`` on PostgreSQL (which may also pick it for tiny tables).
+        """
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                details = [row[-1] for row in cursor.fetchall()]
+                return [detail.split()[-1] for detail in details
+                        if detail.startswith('SCAN') and 'USING' not in detail]
+            cursor.execute(f'EXPLAIN {sql}')
+            return [match.group(1) for (line,) in cursor.fetchall()
+                    for match in [re.search(r'Seq Scan on (\S+)', line)] if match]
@@ -0,0 +1,107 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+
+from accommodation.availability import retry_on_lock_conflict
+from accommodation.models import Accommodation, RoomBooking, RoomNightInventory, RoomType, RoomUnavailable, stay_nights
+
+
+class Command(BaseCommand):
+    help = ('Book rooms of a throwaway accommodation from many threads at once, then check that no night '
+            'was oversold, that the night inventory matches the bookings, and report the bookings/sec.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Number of concurrent booking threads')
+        parser.add_argument('--bookings', type=int, default=500, help='Total number of booking attempts')
+        parser.add_argument('--rooms', type=int, default=20, help='total_rooms of the test accommodation')
+        parser.add_argument('--nights', type=int, default=3, help='Length of every stay')
+        parser.add_argument('--window', type=int, default=7,
+                            help='Check-in dates are drawn from this many days; 1 makes every attempt fight for the same stay')
+        parser.add_argument('--target-rate', type=float, default=0,
+                            help='Fail when fewer booking attempts per second were processed')
+        parser.add_argument('--keep', action='store_true', help='Keep the test accommodation and its bookings')
+
+    def handle(self, *args, **options):
+        room_type = RoomType.objects.create(room_type='Load test', price_per_night=100, max_occupancy=2)
+        accommodation = Accommodation.objects.create(
+            name='Load test', location='Load test', star_rating=1, total_rooms=options['rooms'], amenities='',
+            check_in_time='14:00', check_out_time='11:00', contact_info='load-test')
+        accommodation.types.add(room_type)
+
+        first_night = date.today() + timedelta(days=365)
+        attempts = iter(range(options['bookings']))
+        lock = threading.Lock()
+        outcomes = Counter()
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if next(attempts, None) is None:
+                            return
+                    check_in = first_night + timedelta(days=random.randrange(options['window']))
+                    booking = RoomBooking(room_type_id=room_type, accommodation_id=accommodation, user_id=0,
+                                          check_in_date=check_in,
+                                          check_out_date=check_in + timedelta(days=options['nights']))
+                    try:
+                        retry_on_lock_conflict(booking.save)
+                        outcome = 'confirmed'
+                    except RoomUnavailable:
+                        outcome = 'unavailable'
+                    except DatabaseError as e:
+                        self.stderr.write(f"Booking failed: {e}")
+                        outcome = 'failed'
+                    with lock:
+                        outcomes[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+        try:
+            oversold, drifted = self.check_inventory(accommodation)
+        finally:
+            if not options['keep']:
+                accommodation.delete()
+                room_type.delete()
+
+        processed = outcomes['confirmed'] + outcomes['unavailable']
+        rate = processed / elapsed if elapsed else 0.0
+        self.stdout.write(f"{options['bookings']} attempts from {options['threads']} threads in {elapsed:.2f}s: "
+                          f"{outcomes['confirmed']} confirmed, {outcomes['unavailable']} sold out, "
+                          f"{outcomes['failed']} failed, {rate:.1f} bookings/sec")
+
+        if oversold:
+            raise CommandError(f"Oversold nights: {oversold}")
+        if drifted:
+            raise CommandError(f"Inventory does not match the bookings on: {drifted}")
+        if outcomes['failed']:
+            raise CommandError(f"{outcomes['failed']} bookings failed after all lock retries")
+        if rate < options['target_rate']:
+            raise CommandError(f"{rate:.1f} bookings/sec is below the target of {options['target_rate']}")
+        self.stdout.write(self.style.SUCCESS("No night was oversold"))
+
+    def check_inventory(self, accommodation):
+        """
+        Count the bookings of every night again and compare with total_rooms and with the inventory.
+        """
+        booked = Counter()
+        for check_in, check_out in RoomBooking.objects.filter(accommodation_id=accommodation).values_list(
+                'check_in_date', 'check_out_date'):
+            booked.update(stay_nights(check_in, check_out))
+        inventory = dict(RoomNightInventory.objects.filter(accommodation_id=accommodation, booked_rooms__gt=0)
+                         .values_list('night', 'booked_rooms'))
+        oversold = sorted(str(night) for night, count in booked.items() if count > accommodation.total_rooms)
+        drifted = sorted(str(night) for night in set(booked) | set(inventory) if booked[night] != inventory.get(night, 0))
+        return oversold, drifted
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accommodation.availability import rebuild_inventory
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-night room inventory from the existing room bookings.'
+
+    def handle(self, *args, **options):
+        rows = rebuild_inventory()
+        self.stdout.write(self.style.SUCCESS(f"Room inventory rebuilt: {rows} accommodation nights booked"))
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.10 on 2026-10-17 08:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedbackreview',
+            index=models.Index(fields=['user_id', 'date'], name='feedback_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedbackreview',
+            index=models.Index(fields=['accommodation_id', 'date'], name='feedback_accom_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roombooking',
+            index=models.Index(fields=['user_id', 'check_in_date'], name='roombooking_user_checkin_idx'),
+        ),
+    ]
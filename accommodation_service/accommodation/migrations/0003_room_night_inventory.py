@@ -0,0 +1,45 @@
+# Generated by Django 3.2.10 on 2026-10-17 08:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import Counter
+from datetime import timedelta
+
+
+def backfill_inventory(apps, schema_editor):
+    RoomBooking = apps.get_model('accommodation', 'RoomBooking')
+    RoomNightInventory = apps.get_model('accommodation', 'RoomNightInventory')
+    booked = Counter()
+    for accommodation_id, check_in, check_out in RoomBooking.objects.values_list(
+            'accommodation_id', 'check_in_date', 'check_out_date').iterator():
+        for offset in range((check_out - check_in).days):
+            booked[accommodation_id, check_in + timedelta(days=offset)] += 1
+    RoomNightInventory.objects.bulk_create(
+        [RoomNightInventory(accommodation_id_id=accommodation_id, night=night, booked_rooms=count)
+         for (accommodation_id, night), count in booked.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodation', '0002_per_user_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomNightInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('booked_rooms', models.PositiveIntegerField(default=0)),
+                ('accommodation_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accommodation.accommodation')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='roomnightinventory',
+            constraint=models.UniqueConstraint(fields=('accommodation_id', 'night'), name='inventory_accom_night_uniq'),
+        ),
+        migrations.RunPython(backfill_inventory, migrations.RunPython.noop),
+    ]
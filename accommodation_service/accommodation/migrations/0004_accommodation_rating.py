@@ -0,0 +1,48 @@
+# Generated by Django 3.2.10 on 2026-10-17 08:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+from collections import Counter, defaultdict
+
+
+def backfill_ratings(apps, schema_editor):
+    FeedbackReview = apps.get_model('accommodation', 'FeedbackReview')
+    AccommodationRating = apps.get_model('accommodation', 'AccommodationRating')
+    histograms = defaultdict(Counter)
+    for accommodation_id, rating in FeedbackReview.objects.values_list('accommodation_id', 'rating').iterator():
+        histograms[accommodation_id][rating] += 1
+    summaries = []
+    for accommodation_id, histogram in histograms.items():
+        review_count = sum(histogram.values())
+        rating_sum = sum(rating * reviews for rating, reviews in histogram.items())
+        summaries.append(AccommodationRating(
+            accommodation_id_id=accommodation_id, review_count=review_count, rating_sum=rating_sum,
+            rating_mean=rating_sum / review_count,
+            histogram={str(rating): reviews for rating, reviews in sorted(histogram.items())},
+        ))
+    AccommodationRating.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accommodation', '0003_room_night_inventory'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccommodationRating',
+            fields=[
+                ('accommodation_id', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to='accommodation.accommodation')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_mean', models.FloatField(blank=True, null=True)),
+                ('histogram', models.JSONField(default=dict)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='accommodationrating',
+            index=models.Index(fields=['rating_mean'], name='rating_mean_idx'),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
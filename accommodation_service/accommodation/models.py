@@ -1,5 +1,8 @@
-from datetime import datetime
-from django.db import models
+from datetime import datetime, timedelta
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 
 class Accommodation(models.Model):
     name = models.CharField(max_length=255)
@@ -35,13 +38,116 @@ class RoomBooking(models.Model):
     booking_status = models.BooleanField(default=False)
     payment_status = models.BooleanField(default=False)
 
+    class Meta:
+        # Per-user booking list
+        indexes = [
+            models.Index(fields=['user_id', 'check_in_date'], name='roombooking_user_checkin_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if isinstance(self.check_in_date, str):
             self.check_in_date = datetime.strptime(self.check_in_date, '%Y-%m-%d').date()
         if isinstance(self.check_out_date, str):
             self.check_out_date = datetime.strptime(self.check_out_date, '%Y-%m-%d').date()
         self.total_price = self.room_type_id.price_per_night * (self.check_out_date - self.check_in_date).days
-        super(RoomBooking, self).save(*args, **kwargs)
+        stay = (self.accommodation_id_id, self.check_in_date, self.check_out_date)
+        with transaction.atomic():
+            RoomNightInventory.objects.lock_for_write()
+            previous = None
+            if self.pk:
+                previous = RoomBooking.objects.select_for_update().filter(pk=self.pk).values_list(
+                    'accommodation_id', 'check_in_date', 'check_out_date').first()
+            # 只改支付、确认等状态时不动库存，房间数调低后已有的预订仍然可以更新
+            if previous != stay:
+                # 修改预订时先释放原来占用的房晚，再按新的日期占用
+                if previous:
+                    RoomNightInventory.objects.release(*previous)
+                RoomNightInventory.objects.reserve(*stay)
+            super(RoomBooking, self).save(*args, **kwargs)
+
+
+@receiver(pre_delete, sender=RoomBooking)
+def release_booked_nights(sender, instance, **kwargs):
+    # 取消预订（包括批量删除和级联删除）时归还房晚；按库中保存的日期归还，内存中的实例可能已过期
+    stored = RoomBooking.objects.filter(pk=instance.pk).values_list(
+        'accommodation_id', 'check_in_date', 'check_out_date').first()
+    if stored:
+        RoomNightInventory.objects.release(*stored)
+
+
+def stay_nights(check_in, check_out):
+    return [check_in + timedelta(days=offset) for offset in range((check_out - check_in).days)]
+
+
+class RoomUnavailable(Exception):
+    """
+    Raised when a night of the requested stay has no free room left.
+    """
+
+    def __init__(self, accommodation_id, check_in, check_out):
+        self.accommodation_id = accommodation_id
+        self.check_in = check_in
+        self.check_out = check_out
+        super().__init__(f"No room left at accommodation {accommodation_id} for {check_in} - {check_out}.")
+
+
+class RoomNightInventoryManager(models.Manager):
+    def lock_for_write(self):
+        """
+        Take the SQLite write lock at the start of the transaction, as BEGIN IMMEDIATE would.
+        A deferred transaction that reads first and upgrades later fails at once with
+        "database is locked" when another writer is active, without waiting for the busy timeout.
+        PostgreSQL locks the inventory rows in the conditional UPDATE itself.
+        """
+        connection = transaction.get_connection(self.db)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f'UPDATE {connection.ops.quote_name(self.model._meta.db_table)} '
+                               f'SET booked_rooms = booked_rooms WHERE 0')
+
+    def reserve(self, accommodation_id, check_in, check_out, rooms=1):
+        """
+        Book ``rooms`` more rooms on every night of [check_in, check_out), or raise RoomUnavailable.
+        One conditional UPDATE claims every night that still has room; when its row count is short
+        of the number of nights, some night is full. Call it inside a transaction, so the
+        partial claim is rolled back together with the booking.
+        """
+        nights = stay_nights(check_in, check_out)
+        if not nights:
+            return
+        self.bulk_create([self.model(accommodation_id_id=accommodation_id, night=night) for night in nights],
+                         ignore_conflicts=True)
+        capacity = Accommodation.objects.values_list('total_rooms', flat=True).get(pk=accommodation_id)
+        claimed = self.filter(accommodation_id=accommodation_id, night__in=nights,
+                              booked_rooms__lte=capacity - rooms).update(booked_rooms=F('booked_rooms') + rooms)
+        if claimed != len(nights):
+            raise RoomUnavailable(accommodation_id, check_in, check_out)
+
+    def release(self, accommodation_id, check_in, check_out, rooms=1):
+        """
+        Give ``rooms`` booked rooms back on every night of [check_in, check_out).
+        """
+        self.filter(accommodation_id=accommodation_id, night__gte=check_in, night__lt=check_out,
+                    booked_rooms__gte=rooms).update(booked_rooms=F('booked_rooms') - rooms)
+
+
+class RoomNightInventory(models.Model):
+    """
+    Booked rooms per accommodation and night, kept up to date by RoomBooking.save and
+    release_booked_nights. Availability searches read this table instead of the bookings,
+    and a booking is only saved when it could claim every night of its stay here.
+    """
+    accommodation_id = models.ForeignKey('Accommodation', on_delete=models.CASCADE)
+    night = models.DateField()
+    booked_rooms = models.PositiveIntegerField(default=0)
+
+    objects = RoomNightInventoryManager()
+
+    class Meta:
+        # 唯一约束同时作为 (accommodation, night) 范围查询的索引
+        constraints = [
+            models.UniqueConstraint(fields=['accommodation_id', 'night'], name='inventory_accom_night_uniq'),
+        ]
 
 class GuestService(models.Model):
     accommodation_id = models.ForeignKey('Accommodation', on_delete=models.CASCADE)
@@ -57,4 +163,74 @@ class FeedbackReview(models.Model):
     user_id = models.IntegerField()
     rating = models.PositiveIntegerField()
     review = models.TextField()
-    date = models.DateField()
\ No newline at end of file
+    date = models.DateField()
+
+    class Meta:
+        # Per-user review list and reviews by accommodation
+        indexes = [
+            models.Index(fields=['user_id', 'date'], name='feedback_user_date_idx'),
+            models.Index(fields=['accommodation_id', 'date'], name='feedback_accom_date_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            # 修改评价时先从原来的汇总中减去旧评分
+            if self.pk:
+                previous = FeedbackReview.objects.filter(pk=self.pk).values_list('accommodation_id', 'rating').first()
+                if previous:
+                    AccommodationRating.objects.remove(*previous)
+            AccommodationRating.objects.add(self.accommodation_id_id, self.rating)
+            super(FeedbackReview, self).save(*args, **kwargs)
+
+
+@receiver(pre_delete, sender=FeedbackReview)
+def forget_review_rating(sender, instance, **kwargs):
+    stored = FeedbackReview.objects.filter(pk=instance.pk).values_list('accommodation_id', 'rating').first()
+    if stored:
+        AccommodationRating.objects.remove(*stored)
+
+
+class AccommodationRatingManager(models.Manager):
+    def add(self, accommodation_id, rating):
+        """
+        Count one more review with ``rating``; the summary row is locked while it is changed.
+        """
+        summary, _ = self.select_for_update().get_or_create(accommodation_id_id=accommodation_id)
+        summary.apply(rating, 1)
+
+    def remove(self, accommodation_id, rating):
+        # 级联删除住宿时汇总行可能已经不存在，此时无需处理
+        summary = self.select_for_update().filter(accommodation_id=accommodation_id).first()
+        if summary is not None:
+            summary.apply(rating, -1)
+
+
+class AccommodationRating(models.Model):
+    """
+    Review count, mean and per-rating histogram of one accommodation, kept up to date by
+    FeedbackReview.save and forget_review_rating, so showing or sorting by rating never reads the reviews.
+    """
+    accommodation_id = models.OneToOneField('Accommodation', on_delete=models.CASCADE, primary_key=True,
+                                            related_name='rating_summary')
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_mean = models.FloatField(blank=True, null=True)
+    histogram = models.JSONField(default=dict)  # 评分 -> 评价数
+
+    objects = AccommodationRatingManager()
+
+    class Meta:
+        # Sorting accommodations by rating
+        indexes = [
+            models.Index(fields=['rating_mean'], name='rating_mean_idx'),
+        ]
+
+    def apply(self, rating, count):
+        key = str(rating)
+        self.histogram[key] = self.histogram.get(key, 0) + count
+        if self.histogram[key] <= 0:
+            del self.histogram[key]
+        self.review_count += count
+        self.rating_sum += rating * count
+        self.rating_mean = self.rating_sum / self.review_count if self.review_count else None
+        self.save()
@@ -0,0 +1,32 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import AccommodationRating, FeedbackReview
+
+
+def rebuild_rating_summaries():
+    """
+    Recompute every accommodation's rating summary from the reviews; used to backfill and to repair drift.
+    Returns the number of summaries written.
+    """
+    histograms = defaultdict(Counter)
+    rows = FeedbackReview.objects.values('accommodation_id', 'rating').annotate(reviews=Count('id')).order_by()
+    for row in rows:
+        histograms[row['accommodation_id']][row['rating']] += row['reviews']
+
+    summaries = []
+    for accommodation_id, histogram in histograms.items():
+        review_count = sum(histogram.values())
+        rating_sum = sum(rating * reviews for rating, reviews in histogram.items())
+        summaries.append(AccommodationRating(
+            accommodation_id_id=accommodation_id, review_count=review_count, rating_sum=rating_sum,
+            rating_mean=rating_sum / review_count,
+            histogram={str(rating): reviews for rating, reviews in sorted(histogram.items())},
+        ))
+
+    with transaction.atomic():
+        AccommodationRating.objects.all().delete()
+        AccommodationRating.objects.bulk_create(summaries, batch_size=1000)
+    return len(summaries)
@@ -0,0 +1,53 @@
+from django.db.models import F, OuterRef, Prefetch, Subquery
+
+from .availability import bookable_room_types
+from .models import Accommodation
+
+# ordering 参数 -> ORDER BY，末尾加 id 保证分页顺序稳定
+SEARCH_ORDERINGS = {
+    'price': ('min_price', 'id'),
+    '-price': ('-min_price', 'id'),
+    'star_rating': ('star_rating', 'id'),
+    '-star_rating': ('-star_rating', 'id'),
+    'name': ('name', 'id'),
+    # 没有评价的住宿排在最后
+    'rating': (F('rating_summary__rating_mean').asc(nulls_last=True), 'id'),
+    '-rating': (F('rating_summary__rating_mean').desc(nulls_last=True),
+                F('rating_summary__review_count').desc(nulls_last=True), 'id'),
+    'id': ('id',),
+}
+
+
+def search_accommodations(location=None, star_rating=None, min_star_rating=None, guests=None,
+                          min_price=None, max_price=None, amenities=None, ordering='id'):
+    """
+    Accommodations with at least one available room type that fits ``guests`` and costs
+    between ``min_price`` and ``max_price`` per night. The cheapest matching price is annotated
+    in SQL as ``min_price``; the matching room types are prefetched into ``matching_types``
+    with one extra query per page, and the rating summary is joined in. ``amenities`` must all
+    appear in the amenities text.
+    """
+    room_types = bookable_room_types(guests or 1)
+    if min_price is not None:
+        room_types = room_types.filter(price_per_night__gte=min_price)
+    if max_price is not None:
+        room_types = room_types.filter(price_per_night__lte=max_price)
+
+    queryset = Accommodation.objects.select_related('rating_summary')
+    if location:
+        queryset = queryset.filter(location__icontains=location)
+    if star_rating is not None:
+        queryset = queryset.filter(star_rating=star_rating)
+    if min_star_rating is not None:
+        queryset = queryset.filter(star_rating__gte=min_star_rating)
+    for amenity in amenities or []:
+        queryset = queryset.filter(amenities__icontains=amenity)
+
+    cheapest = room_types.filter(accommodation=OuterRef('pk')).order_by('price_per_night').values('price_per_night')[:1]
+    return queryset.annotate(
+        min_price=Subquery(cheapest),
+    ).filter(
+        min_price__isnull=False,
+    ).prefetch_related(
+        Prefetch('types', queryset=room_types, to_attr='matching_types'),
+    ).order_by(*SEARCH_ORDERINGS[ordering])
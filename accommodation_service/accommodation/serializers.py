@@ -1,7 +1,16 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Accommodation, RoomType, RoomBooking, GuestService, FeedbackReview
+from .models import Accommodation, RoomType, RoomBooking, GuestService, FeedbackReview, AccommodationRating
+
+class AccommodationRatingSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AccommodationRating
+        fields = ['review_count', 'rating_mean', 'histogram']
 
 class AccommodationSerializer(serializers.ModelSerializer):
+    # 没有评价时为 null
+    rating = AccommodationRatingSerializer(source='rating_summary', read_only=True)
+
     class Meta:
         model = Accommodation
         fields = '__all__'
@@ -22,6 +31,70 @@ class AccommodationCalculatePriceSerializer(serializers.Serializer):
     room_id = serializers.IntegerField()
     number_of_days = serializers.IntegerField(min_value=1)
 
+class AccommodationBatchCalculatePriceSerializer(serializers.Serializer):
+    # 每一项单独校验，单项出错不影响其它报价
+    quotes = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_quotes(self, value):
+        max_items = getattr(settings, 'ROOM_QUOTE_BATCH_MAX_ITEMS', 100)
+        if len(value) > max_items:
+            raise serializers.ValidationError(f"At most {max_items} quotes are allowed per request.")
+        return value
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    check_in = serializers.DateField()
+    check_out = serializers.DateField()
+    guests = serializers.IntegerField(min_value=1, default=1)
+
+    def validate(self, attrs):
+        if attrs['check_out'] <= attrs['check_in']:
+            raise serializers.ValidationError({'check_out': 'check_out must be after check_in.'})
+        return attrs
+
+class AvailableRoomTypeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RoomType
+        fields = ['id', 'room_type', 'price_per_night', 'max_occupancy']
+
+class AccommodationAvailabilitySerializer(serializers.ModelSerializer):
+    available_rooms = serializers.IntegerField(read_only=True)
+    room_types = AvailableRoomTypeSerializer(source='bookable_types', many=True, read_only=True)
+
+    class Meta:
+        model = Accommodation
+        fields = ['id', 'name', 'location', 'star_rating', 'img_url', 'available_rooms', 'room_types']
+
+class AccommodationSearchQuerySerializer(serializers.Serializer):
+    location = serializers.CharField(required=False)
+    star_rating = serializers.IntegerField(required=False, min_value=0)
+    min_star_rating = serializers.IntegerField(required=False, min_value=0)
+    guests = serializers.IntegerField(required=False, min_value=1)
+    min_price = serializers.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=0)
+    max_price = serializers.DecimalField(required=False, max_digits=10, decimal_places=2, min_value=0)
+    amenities = serializers.CharField(required=False, help_text="Comma separated, all must be offered")
+    ordering = serializers.ChoiceField(required=False, default='id',
+                                       choices=['id', 'price', '-price', 'star_rating', '-star_rating', 'name',
+                                                'rating', '-rating'])
+
+    def validate_amenities(self, value):
+        return [amenity.strip() for amenity in value.split(',') if amenity.strip()]
+
+    def validate(self, attrs):
+        if attrs.get('min_price') is not None and attrs.get('max_price') is not None \
+                and attrs['min_price'] > attrs['max_price']:
+            raise serializers.ValidationError({'max_price': 'max_price must not be below min_price.'})
+        return attrs
+
+class AccommodationSearchSerializer(serializers.ModelSerializer):
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    room_types = AvailableRoomTypeSerializer(source='matching_types', many=True, read_only=True)
+    rating = AccommodationRatingSerializer(source='rating_summary', read_only=True)
+
+    class Meta:
+        model = Accommodation
+        fields = ['id', 'name', 'location', 'star_rating', 'total_rooms', 'amenities', 'check_in_time',
+                  'check_out_time', 'contact_info', 'img_url', 'min_price', 'rating', 'room_types']
+
 class GuestServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = GuestService
@@ -1,10 +1,38 @@
-from django.test import TestCase, override_settings
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
-from .models import Accommodation, RoomType, RoomBooking, GuestService, FeedbackReview
+from .models import (
+    Accommodation, RoomType, RoomBooking, GuestService, FeedbackReview, RoomNightInventory, AccommodationRating
+)
 from django.contrib.auth import get_user_model
 from datetime import date, timedelta
+import io
+import os
+import socket
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+from requests.exceptions import ConnectionError as RequestsConnectionError, RequestException
+from django.test import RequestFactory
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework_simplejwt.tokens import AccessToken
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from .RequestLoggingMiddleware import RequestLoggingMiddleware
+from .auth_backend import JWTAuthBackend
+from .availability import rebuild_inventory
+from .ratings import rebuild_rating_summaries
+from . import circuit_breaker, event_shipper
+from .circuit_breaker import CircuitBreaker
+from .event_shipper import EventLogShipper
+from .event_spool import EventSpool
+from .http_client import build_session
+from .user_cache import UserCache, get_user_cache
 
 User = get_user_model()
 
@@ -72,6 +100,66 @@ class AccommodationViewSetTest(BaseTestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Accommodation.objects.count(), 2)
 
+class AccommodationSearchTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.single = RoomType.objects.create(room_type="Single", price_per_night=60.00, max_occupancy=1)
+        self.double = RoomType.objects.create(room_type="Double", price_per_night=120.00, max_occupancy=2)
+        self.family = RoomType.objects.create(room_type="Family", price_per_night=300.00, max_occupancy=4)
+        self.hostel = self.create_accommodation("City Hostel", "Harbour City", 2, "WiFi", [self.single])
+        self.hotel = self.create_accommodation("Grand Hotel", "Harbour City", 5, "WiFi, Pool, Gym",
+                                               [self.double, self.family])
+        self.lodge = self.create_accommodation("Mountain Lodge", "Hill Town", 3, "Parking, WiFi",
+                                               [self.single, self.family])
+        self.url = reverse('accommodation-search')
+
+    def create_accommodation(self, name, location, star_rating, amenities, room_types):
+        accommodation = Accommodation.objects.create(
+            name=name, location=location, star_rating=star_rating, total_rooms=10, amenities=amenities,
+            check_in_time="14:00", check_out_time="11:00", contact_info="search@hotel.com")
+        accommodation.types.add(*room_types)
+        return accommodation
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_results_embed_room_types_and_min_price(self):
+        # 分页计数、当前页、房型预取各一次查询
+        with self.assertNumQueries(3):
+            data = self.search(ordering='price')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([result['name'] for result in data['results']],
+                         ["City Hostel", "Mountain Lodge", "Grand Hotel"])
+        lodge = data['results'][1]
+        self.assertEqual(float(lodge['min_price']), 60.00)
+        self.assertEqual([room['room_type'] for room in lodge['room_types']], ["Single", "Family"])
+
+    def test_filters(self):
+        data = self.search(location="harbour", guests=2)
+        self.assertEqual([result['name'] for result in data['results']], ["Grand Hotel"])
+        self.assertEqual([room['room_type'] for room in data['results'][0]['room_types']], ["Double", "Family"])
+
+        data = self.search(min_price=100, max_price=200)
+        self.assertEqual([result['name'] for result in data['results']], ["Grand Hotel"])
+        self.assertEqual(float(data['results'][0]['min_price']), 120.00)
+
+        self.assertEqual(self.search(amenities="wifi, parking")['count'], 1)
+        self.assertEqual(self.search(min_star_rating=3, ordering='-star_rating')['results'][0]['name'], "Grand Hotel")
+        self.assertEqual(self.search(star_rating=2)['results'][0]['name'], "City Hostel")
+
+    def test_unavailable_room_types_are_left_out(self):
+        RoomType.objects.filter(id=self.single.id).update(availability=False)
+        self.assertEqual([result['name'] for result in self.search()['results']], ["Grand Hotel", "Mountain Lodge"])
+
+    def test_pagination_and_invalid_params(self):
+        data = self.search(page_size=2, page=2)
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(len(data['results']), 1)
+        response = self.client.get(self.url, {'min_price': 200, 'max_price': 100})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 class RoomBookingViewSetTest(BaseTestCase):
     def setUp(self):
         super().setUp()
@@ -116,6 +204,164 @@ class RoomBookingViewSetTest(BaseTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['total_price'], 300.00)
 
+    def test_calculate_prices_batch(self):
+        other_room = RoomType.objects.create(room_type="Suite", price_per_night=250.00, max_occupancy=2)
+        url = reverse('roombooking-calculate-prices')
+        data = {"quotes": [
+            {"accommodation_id": self.accommodation.id, "room_id": self.room_type.id, "number_of_days": 3},
+            {"accommodation_id": self.accommodation.id, "room_id": other_room.id, "number_of_days": 1},
+            {"accommodation_id": self.accommodation.id + 100, "room_id": self.room_type.id, "number_of_days": 1},
+            {"accommodation_id": self.accommodation.id, "room_id": self.room_type.id, "number_of_days": 0},
+            {"accommodation_id": self.accommodation.id, "room_id": self.room_type.id, "number_of_days": 2},
+        ]}
+        # 无论多少条报价都只查询两次
+        with self.assertNumQueries(2):
+            response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        quotes = response.data['quotes']
+        self.assertEqual([quote['status'] for quote in quotes], [200, 404, 404, 400, 200])
+        self.assertEqual(quotes[0]['total_price'], 300.00)
+        self.assertEqual(quotes[4]['total_price'], 200.00)
+        self.assertIn('number_of_days', quotes[3]['errors'])
+
+    def test_calculate_prices_batch_limit(self):
+        url = reverse('roombooking-calculate-prices')
+        quote = {"accommodation_id": self.accommodation.id, "room_id": self.room_type.id, "number_of_days": 1}
+        with self.settings(ROOM_QUOTE_BATCH_MAX_ITEMS=2):
+            response = self.client.post(url, {"quotes": [quote] * 3}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class RoomAvailabilityTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.accommodation = Accommodation.objects.create(
+            name="Small Inn", location="Test City", star_rating=3, total_rooms=1, amenities="WiFi",
+            check_in_time="14:00", check_out_time="11:00", contact_info="inn@hotel.com")
+        self.double = RoomType.objects.create(room_type="Double", price_per_night=80.00, max_occupancy=2)
+        self.family = RoomType.objects.create(room_type="Family", price_per_night=150.00, max_occupancy=4)
+        self.accommodation.types.add(self.double, self.family)
+        self.check_in = date.today() + timedelta(days=10)
+        self.url = reverse('accommodation-availability')
+
+    def book(self, check_in, nights):
+        return RoomBooking.objects.create(
+            room_type_id=self.double, accommodation_id=self.accommodation, user_id=self.user.id,
+            check_in_date=check_in, check_out_date=check_in + timedelta(days=nights))
+
+    def search(self, check_in, nights, guests=1):
+        response = self.client.get(self.url, {
+            'check_in': check_in.isoformat(),
+            'check_out': (check_in + timedelta(days=nights)).isoformat(),
+            'guests': guests,
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_free_accommodation_lists_fitting_room_types(self):
+        results = self.search(self.check_in, 2, guests=3)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['available_rooms'], 1)
+        self.assertEqual([room['room_type'] for room in results[0]['room_types']], ['Family'])
+
+    def test_booked_nights_are_excluded_and_released_on_cancel(self):
+        booking = self.book(self.check_in, 3)
+        self.assertEqual(self.search(self.check_in + timedelta(days=2), 2), [])
+        # 退房当天可以再次入住
+        self.assertEqual(len(self.search(self.check_in + timedelta(days=3), 2)), 1)
+
+        booking.delete()
+        self.assertEqual(len(self.search(self.check_in + timedelta(days=2), 2)), 1)
+        self.assertFalse(RoomNightInventory.objects.filter(booked_rooms__gt=0).exists())
+
+    def test_changing_dates_moves_booked_nights(self):
+        booking = self.book(self.check_in, 2)
+        booking.check_in_date = self.check_in + timedelta(days=5)
+        booking.check_out_date = self.check_in + timedelta(days=6)
+        booking.save()
+        self.assertEqual(len(self.search(self.check_in, 2)), 1)
+        self.assertEqual(self.search(self.check_in + timedelta(days=5), 1), [])
+
+    def test_cancelling_a_stale_booking_releases_the_stored_nights(self):
+        booking = self.book(self.check_in, 2)
+        stale = RoomBooking.objects.get(id=booking.id)
+        booking.check_in_date = self.check_in + timedelta(days=5)
+        booking.check_out_date = self.check_in + timedelta(days=7)
+        booking.save()
+
+        # stale 仍保存着修改前的日期
+        stale.delete()
+        self.assertFalse(RoomNightInventory.objects.filter(booked_rooms__gt=0).exists())
+        self.assertEqual(len(self.search(self.check_in + timedelta(days=5), 2)), 1)
+
+    def test_no_room_type_for_party_size(self):
+        self.assertEqual(self.search(self.check_in, 1, guests=5), [])
+
+    def test_invalid_range(self):
+        response = self.client.get(self.url, {'check_in': self.check_in.isoformat(),
+                                              'check_out': self.check_in.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_inventory_matches_incremental_counts(self):
+        Accommodation.objects.filter(id=self.accommodation.id).update(total_rooms=2)
+        self.book(self.check_in, 2)
+        self.book(self.check_in + timedelta(days=1), 2)
+        incremental = set(RoomNightInventory.objects.values_list('night', 'booked_rooms'))
+        self.assertEqual(rebuild_inventory(), 3)
+        self.assertEqual(set(RoomNightInventory.objects.values_list('night', 'booked_rooms')), incremental)
+
+class RoomOverbookingTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.accommodation = Accommodation.objects.create(
+            name="Small Inn", location="Test City", star_rating=3, total_rooms=1, amenities="WiFi",
+            check_in_time="14:00", check_out_time="11:00", contact_info="inn@hotel.com")
+        self.room_type = RoomType.objects.create(room_type="Double", price_per_night=80.00, max_occupancy=2)
+        self.accommodation.types.add(self.room_type)
+        self.check_in = date.today() + timedelta(days=10)
+
+    def post_booking(self, check_in, nights):
+        return self.client.post(reverse('roombooking-list'), {
+            "room_type_id": self.room_type.id,
+            "accommodation_id": self.accommodation.id,
+            "check_in_date": check_in.isoformat(),
+            "check_out_date": (check_in + timedelta(days=nights)).isoformat(),
+        })
+
+    def test_last_room_cannot_be_booked_twice(self):
+        self.assertEqual(self.post_booking(self.check_in, 3).status_code, status.HTTP_201_CREATED)
+        response = self.post_booking(self.check_in + timedelta(days=2), 2)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        # 部分房晚的占用随事务回滚
+        self.assertEqual(RoomBooking.objects.count(), 1)
+        self.assertFalse(RoomNightInventory.objects.filter(night=self.check_in + timedelta(days=3),
+                                                           booked_rooms__gt=0).exists())
+
+    def test_moving_a_booking_onto_a_full_night_is_rejected(self):
+        self.post_booking(self.check_in, 1)
+        booking_id = self.post_booking(self.check_in + timedelta(days=1), 1).data['id']
+        response = self.client.patch(reverse('roombooking-detail', args=[booking_id]),
+                                     {"check_in_date": self.check_in.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(RoomBooking.objects.get(id=booking_id).check_in_date, self.check_in + timedelta(days=1))
+
+    def test_status_update_does_not_recheck_inventory(self):
+        booking_id = self.post_booking(self.check_in, 2).data['id']
+        Accommodation.objects.filter(id=self.accommodation.id).update(total_rooms=0)
+        response = self.client.patch(reverse('roombooking-detail', args=[booking_id]), {"payment_status": True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(RoomBooking.objects.get(id=booking_id).payment_status)
+        self.assertEqual(sorted(RoomNightInventory.objects.values_list('booked_rooms', flat=True)), [1, 1])
+
+
+class BookingLoadTest(TransactionTestCase):
+    def test_concurrent_bookings_never_oversell(self):
+        out = io.StringIO()
+        # 所有线程抢同一段入住日期，只有 rooms 个预订能成功
+        call_command('load_test_bookings', threads=8, bookings=80, rooms=5, nights=3, window=1, stdout=out)
+        self.assertIn('5 confirmed, 75 sold out, 0 failed', out.getvalue())
+        self.assertIn('No night was oversold', out.getvalue())
+        self.assertFalse(RoomBooking.objects.exists())
+
 class GuestServiceViewSetTest(BaseTestCase):
     def setUp(self):
         super().setUp()
@@ -190,6 +436,77 @@ class FeedbackReviewViewSetTest(BaseTestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['rating'], 5)
 
+class AccommodationRatingTest(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.accommodation = Accommodation.objects.create(
+            name="Test Hotel", location="Test City", star_rating=4, total_rooms=100, amenities="WiFi",
+            check_in_time="14:00", check_out_time="11:00", contact_info="test@hotel.com")
+        self.room_type = RoomType.objects.create(room_type="Standard", price_per_night=100.00, max_occupancy=2)
+        self.accommodation.types.add(self.room_type)
+
+    def review(self, rating, accommodation=None):
+        return FeedbackReview.objects.create(accommodation_id=accommodation or self.accommodation,
+                                             user_id=self.user.id, rating=rating, review="Nice", date=date.today())
+
+    def summary(self):
+        return AccommodationRating.objects.get(accommodation_id=self.accommodation)
+
+    def test_summary_follows_create_update_and_delete(self):
+        response = self.client.post(reverse('feedbackreview-list'), {
+            "accommodation_id": self.accommodation.id, "rating": 5, "review": "Great", "date": date.today().isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        review = self.review(3)
+        self.assertEqual((self.summary().review_count, self.summary().rating_mean), (2, 4.0))
+        self.assertEqual(self.summary().histogram, {"5": 1, "3": 1})
+
+        self.client.patch(reverse('feedbackreview-detail', args=[review.id]), {"rating": 4})
+        self.assertEqual(self.summary().rating_mean, 4.5)
+        self.assertEqual(self.summary().histogram, {"5": 1, "4": 1})
+
+        review.delete()
+        self.assertEqual((self.summary().review_count, self.summary().rating_mean), (1, 5.0))
+        FeedbackReview.objects.all().delete()
+        self.assertEqual((self.summary().review_count, self.summary().rating_mean), (0, None))
+
+    def test_rating_in_list_and_detail(self):
+        self.review(4)
+        self.review(2)
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse('accommodation-list')).data
+        self.assertEqual(data[0]['rating'], {"review_count": 2, "rating_mean": 3.0, "histogram": {"4": 1, "2": 1}})
+        self.assertEqual(data[0]['types'], [self.room_type.id])
+        detail = self.client.get(reverse('accommodation-detail', args=[self.accommodation.id])).data
+        self.assertEqual(detail['rating']['rating_mean'], 3.0)
+
+    def test_search_sorts_by_rating(self):
+        other = Accommodation.objects.create(
+            name="Other Hotel", location="Test City", star_rating=3, total_rooms=10, amenities="WiFi",
+            check_in_time="14:00", check_out_time="11:00", contact_info="other@hotel.com")
+        other.types.add(self.room_type)
+        unrated = Accommodation.objects.create(
+            name="New Hotel", location="Test City", star_rating=3, total_rooms=10, amenities="WiFi",
+            check_in_time="14:00", check_out_time="11:00", contact_info="new@hotel.com")
+        unrated.types.add(self.room_type)
+        self.review(3)
+        self.review(5, accommodation=other)
+
+        results = self.client.get(reverse('accommodation-search'), {'ordering': '-rating'}).data['results']
+        self.assertEqual([result['name'] for result in results], ["Other Hotel", "Test Hotel", "New Hotel"])
+        self.assertIsNone(results[2]['rating'])
+
+    def test_rebuild_matches_incremental_summary(self):
+        for rating in (1, 4, 4):
+            self.review(rating)
+        incremental = AccommodationRating.objects.values().get()
+        self.assertEqual(rebuild_rating_summaries(), 1)
+        self.assertEqual(AccommodationRating.objects.values().get(), incremental)
+
+    def test_deleting_accommodation_removes_summary(self):
+        self.review(5)
+        self.accommodation.delete()
+        self.assertFalse(AccommodationRating.objects.exists())
+
 # 保留原有的模型测试
 class AccommodationModelTest(TestCase):
     def setUp(self):
@@ -219,3 +536,386 @@ class RoomTypeModelTest(TestCase):
     def test_room_type_creation(self):
         self.assertEqual(self.room_type.room_type, "Standard")
         self.assertEqual(self.room_type.price_per_night, 100.00)
+
+
+class EventLogShipperTest(TestCase):
+    def test_overflow_drops_newest(self):
+        shipper = EventLogShipper('http://logs', queue_size=1, overflow_policy='drop_newest')
+        with patch.object(shipper, '_ensure_worker'):
+            self.assertTrue(shipper.enqueue('create', {'activity': 'first'}))
+            self.assertFalse(shipper.enqueue('create', {'activity': 'second'}))
+        self.assertEqual(shipper.dropped, 1)
+        self.assertEqual(shipper.queue.get_nowait()[1]['activity'], 'first')
+
+    def test_overflow_drops_oldest(self):
+        shipper = EventLogShipper('http://logs', queue_size=1, overflow_policy='drop_oldest')
+        with patch.object(shipper, '_ensure_worker'):
+            shipper.enqueue('create', {'activity': 'first'})
+            self.assertTrue(shipper.enqueue('create', {'activity': 'second'}))
+        self.assertEqual(shipper.dropped, 1)
+        self.assertEqual(shipper.queue.get_nowait()[1]['activity'], 'second')
+
+    @patch('accommodation.event_shipper.http_client.post')
+    def test_records_are_sent_in_one_bulk_request(self, mock_post):
+        mock_post.return_value.status_code = 201
+        shipper = EventLogShipper('http://logs', batch_size=10, flush_interval=0.05)
+        for i in range(3):
+            shipper.enqueue('record', {'event_id': str(i), 'activity': 'Accommodation List'})
+        shipper.flush()
+
+        mock_post.assert_called_once()
+        self.assertEqual(mock_post.call_args[0][0], 'http://logs/api/customUser/event-logs/bulk/')
+        self.assertEqual(len(mock_post.call_args[1]['json']), 3)
+
+    @patch('accommodation.event_shipper.http_client.patch')
+    @patch('accommodation.event_shipper.http_client.post')
+    def test_update_reuses_id_from_create(self, mock_post, mock_patch):
+        mock_post.return_value.status_code = 201
+        mock_post.return_value.json.return_value = {'data': {'id': 7}}
+        mock_patch.return_value.status_code = 200
+        shipper = EventLogShipper('http://logs', flush_interval=0.01)
+        handle = {}
+        shipper.enqueue('create', {'activity': 'Accommodation List'}, handle)
+        shipper.enqueue('update', {'activity': 'Accommodation List', 'status_code': 200}, handle)
+        shipper.flush()
+
+        mock_post.assert_called_once()
+        self.assertEqual(mock_patch.call_args[0][0], 'http://logs/api/customUser/event-logs/7/')
+
+
+class EventSpoolTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # 进程级 shipper 落盘到临时目录，不写 BASE_DIR/event_log_spool
+        spool_settings = override_settings(EVENT_LOG_SPOOL_DIR=self.tmp.name, LOGS_BREAKER_FALLBACK='spool')
+        spool_settings.enable()
+        self.addCleanup(spool_settings.disable)
+        event_shipper._shipper = None
+        circuit_breaker._breakers.clear()
+
+    def tearDown(self):
+        event_shipper._shipper = None
+        circuit_breaker._breakers.clear()
+
+    def test_drain_replays_and_removes_segments(self):
+        spool = EventSpool(self.tmp.name, segment_max_bytes=64)
+        spool.append([{'event_id': str(i), 'activity': 'Accommodation List'} for i in range(3)])
+        spool.append([{'event_id': '3', 'activity': 'Accommodation List'}])
+        sent = []
+        self.assertEqual(spool.drain(lambda records: sent.extend(records) or True, chunk_size=2), 4)
+        self.assertEqual([record['event_id'] for record in sent], ['0', '1', '2', '3'])
+        self.assertFalse(spool.has_pending())
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_failed_drain_keeps_segment(self):
+        spool = EventSpool(self.tmp.name)
+        spool.append([{'event_id': '1'}])
+        self.assertEqual(spool.drain(lambda records: False), 0)
+        self.assertTrue(spool.has_pending())
+
+    def test_oldest_segments_are_discarded_over_limit(self):
+        spool = EventSpool(self.tmp.name, segment_max_bytes=1, max_total_bytes=100)
+        for i in range(10):
+            spool.append([{'event_id': str(i), 'activity': 'Accommodation List'}])
+        self.assertLessEqual(spool.size(), 100)
+        self.assertGreater(spool.discarded, 0)
+
+    @patch('accommodation.event_shipper.http_client.post')
+    def test_shipper_spools_when_breaker_is_open_and_replays_later(self, mock_post):
+        breaker = circuit_breaker.get_breaker('logs_api')
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+
+        shipper = event_shipper.get_shipper()
+        self.assertEqual(shipper.spool.directory, self.tmp.name)
+        record = {'event_id': 'spool-test-1', 'activity': 'Accommodation List'}
+        shipper._send_batch([('record', dict(record), {})])
+        mock_post.assert_not_called()
+        self.assertEqual(shipper.undelivered, 0)
+        self.assertTrue(shipper.spool.has_pending())
+
+        breaker.record_success()
+        mock_post.return_value.status_code = 201
+        shipper._maybe_replay_spool()
+        replayed = [sent for call in mock_post.call_args_list for sent in call[1]['json']]
+        self.assertEqual([sent for sent in replayed if sent['event_id'] == record['event_id']], [record])
+        self.assertFalse(shipper.spool.has_pending())
+
+
+class UserCacheTest(TestCase):
+    def test_lru_evicts_least_recently_used(self):
+        cache = UserCache(max_size=2, ttl=60)
+        cache.set('user:1', {'id': 1})
+        cache.set('user:2', {'id': 2})
+        cache.get('user:1')
+        cache.set('user:3', {'id': 3})
+        self.assertIsNone(cache.get('user:2'))
+        self.assertEqual(cache.get('user:1'), {'id': 1})
+
+    def test_expired_entries_are_not_returned(self):
+        cache = UserCache(max_size=2, ttl=0)
+        cache.set('user:1', {'id': 1})
+        self.assertIsNone(cache.get('user:1'))
+
+    @patch('accommodation.auth_backend.http_client.get')
+    def test_get_user_skips_remote_lookup_on_cache_hit(self, mock_get):
+        get_user_cache().clear()
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {'data': {
+            'id': 42, 'email': 'cached@example.com', 'name': 'cached', 'is_staff': False, 'is_active': True,
+        }}
+        backend = JWTAuthBackend()
+        token = {'user_id': 42, 'jti': 'abc'}
+
+        first = backend.get_user(token)
+        second = backend.get_user(token)
+
+        mock_get.assert_called_once()
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(second.email, 'cached@example.com')
+
+    @override_settings(JWT_AUTH_MODE='claims')
+    @patch('accommodation.auth_backend.http_client.get')
+    def test_claims_mode_builds_user_without_remote_lookup(self, mock_get):
+        token = {'user_id': 7, 'email': 'claims@example.com', 'name': 'claims', 'is_staff': True, 'is_active': True}
+        user = JWTAuthBackend().get_user(token)
+
+        mock_get.assert_not_called()
+        self.assertEqual(user.id, 7)
+        self.assertTrue(user.is_staff)
+        self.assertFalse(User.objects.filter(id=7).exists())
+
+
+@override_settings(JWT_AUTH_MODE='claims', LOGGING_ENABLED=False)
+class ClaimsModeWriteTest(APITestCase):
+    def setUp(self):
+        self.accommodation = Accommodation.objects.create(
+            name="Test Hotel", location="Test City", star_rating=4, total_rooms=10, amenities="WiFi",
+            check_in_time="14:00", check_out_time="11:00", contact_info="test@hotel.com")
+        self.room_type = RoomType.objects.create(room_type="Standard", price_per_night=100.00, max_occupancy=2)
+        self.accommodation.types.add(self.room_type)
+        # 本地数据库中没有这个用户
+        token = AccessToken()
+        for claim, value in {'user_id': 900, 'email': 'new@example.com', 'name': 'new', 'is_staff': False,
+                             'is_active': True}.items():
+            token[claim] = value
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_booking_and_review_for_user_without_local_row(self):
+        response = self.client.post(reverse('roombooking-list'), {
+            "room_type_id": self.room_type.id,
+            "accommodation_id": self.accommodation.id,
+            "check_in_date": date.today().isoformat(),
+            "check_out_date": (date.today() + timedelta(days=1)).isoformat(),
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(RoomBooking.objects.get().user_id, 900)
+
+        response = self.client.post(reverse('feedbackreview-list'), {
+            "accommodation_id": self.accommodation.id, "rating": 5, "review": "Great", "date": date.today().isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(FeedbackReview.objects.get().user_id, 900)
+        self.assertFalse(User.objects.filter(id=900).exists())
+
+
+class JWTAuthBackendSharedResultTest(TestCase):
+    def test_request_is_authenticated_only_once(self):
+        http_request = RequestFactory().get('/api/accommodation/accommodations/', HTTP_AUTHORIZATION='Bearer token')
+        user = User(id=5, username='shared')
+        with patch.object(JWTAuthBackend, '_authenticate', return_value=(user, 'token')) as mock_authenticate:
+            # 日志中间件先认证原始 HttpRequest，DRF 随后认证包装后的 Request
+            middleware_result = JWTAuthBackend().authenticate(http_request)
+            drf_result = JWTAuthBackend().authenticate(Request(http_request))
+
+        mock_authenticate.assert_called_once()
+        self.assertIs(middleware_result[0], drf_result[0])
+
+    @override_settings(LOGGING_ENABLED=True)
+    @patch.object(RequestLoggingMiddleware, 'record_event_to_api')
+    def test_logged_viewsets_authenticate_once_per_request(self, mock_record):
+        accommodation = Accommodation.objects.create(
+            name="Test Hotel", location="Test City", star_rating=4, total_rooms=10, amenities="WiFi",
+            check_in_time="14:00", check_out_time="11:00", contact_info="test@hotel.com")
+        room_type = RoomType.objects.create(room_type="Standard", price_per_night=100.00, max_occupancy=2)
+        accommodation.types.add(room_type)
+        client = APIClient(HTTP_AUTHORIZATION='Bearer token')
+        requests = [
+            ('post', reverse('roombooking-list'), {
+                "room_type_id": room_type.id, "accommodation_id": accommodation.id,
+                "check_in_date": date.today().isoformat(),
+                "check_out_date": (date.today() + timedelta(days=1)).isoformat()}),
+            ('get', reverse('roombooking-list'), {}),
+            ('post', reverse('feedbackreview-list'), {
+                "accommodation_id": accommodation.id, "rating": 4, "review": "Good", "date": date.today().isoformat()}),
+            ('get', reverse('accommodation-list'), {}),
+        ]
+        for method, url, data in requests:
+            with patch.object(JWTAuthBackend, '_authenticate',
+                              return_value=(User(id=5, username='shared'), 'token')) as mock_authenticate:
+                response = getattr(client, method)(url, data)
+            self.assertLess(response.status_code, 300, url)
+            # 日志中间件和 DRF 视图共用同一次认证
+            mock_authenticate.assert_called_once()
+            self.assertEqual(mock_record.call_args[0][0]['user_id'], 5)
+
+
+class CaseIdTest(TestCase):
+    def setUp(self):
+        self.middleware = RequestLoggingMiddleware(lambda request: HttpResponse())
+
+    def build_request(self, **extra):
+        headers = {'HTTP_USER_AGENT': 'test-agent', 'REMOTE_ADDR': '10.0.0.1'}
+        headers.update(extra)
+        request = RequestFactory().get('/api/accommodation/accommodations/', **headers)
+        request.session = SessionStore()
+        return request
+
+    def test_anonymous_case_id_does_not_create_session(self):
+        first = self.middleware.get_or_create_case_id(self.build_request(), None)
+        second = self.middleware.get_or_create_case_id(self.build_request(), None)
+        self.assertTrue(first.startswith('anon_'))
+        self.assertEqual(first, second)
+        self.assertFalse(Session.objects.exists())
+
+    def test_case_id_cookie_is_signed_and_reused(self):
+        request = self.build_request()
+        case_id = self.middleware.get_or_create_case_id(request, None)
+        response = self.middleware.process_response(request, HttpResponse())
+
+        cookie = response.cookies['case_id'].value
+        next_request = self.build_request(HTTP_COOKIE=f'case_id={cookie}', HTTP_USER_AGENT='other-agent')
+        self.assertEqual(self.middleware.get_or_create_case_id(next_request, None), case_id)
+
+    def test_client_supplied_case_id(self):
+        request = self.build_request(HTTP_X_CASE_ID='checkout-123')
+        self.assertEqual(self.middleware.get_or_create_case_id(request, None), 'client_checkout-123')
+
+
+class HttpClientTest(TestCase):
+    @override_settings(INTER_SERVICE_CONNECT_TIMEOUT=1.5, INTER_SERVICE_READ_TIMEOUT=3.0, INTER_SERVICE_POOL_SIZE=4)
+    def test_session_applies_default_timeout_and_pool(self):
+        session = build_session()
+        adapter = session.get_adapter('http://auth-service:8003/')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        with patch('requests.Session.request') as mock_request:
+            session.get('http://auth-service:8003/api/customUser/me/')
+        self.assertEqual(mock_request.call_args[1]['timeout'], (1.5, 3.0))
+
+    @override_settings(INTER_SERVICE_READ_TIMEOUT=0.2, INTER_SERVICE_MAX_RETRIES=2, INTER_SERVICE_BACKOFF_FACTOR=0)
+    def test_read_timeouts_are_only_retried_when_allowed(self):
+        # 接受连接但从不响应的服务端，模拟挂起的 auth_service
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(8)
+        self.addCleanup(server.close)
+        connections = []
+        self.addCleanup(lambda: [connection.close() for connection in connections])
+
+        def accept():
+            try:
+                while True:
+                    connections.append(server.accept()[0])
+            except OSError:
+                pass
+
+        threading.Thread(target=accept, daemon=True).start()
+        url = f'http://127.0.0.1:{server.getsockname()[1]}/api/customUser/me/'
+
+        with self.assertRaises(RequestException):
+            build_session(retry_reads=False).get(url)
+        time.sleep(0.1)
+        self.assertEqual(len(connections), 1)
+
+        with self.assertRaises(RequestException):
+            build_session().get(url)
+        time.sleep(0.1)
+        self.assertEqual(len(connections), 1 + 3)
+
+    @patch('accommodation.auth_backend.http_client.get')
+    def test_auth_lookup_does_not_retry_reads(self, mock_get):
+        get_user_cache().clear()
+        mock_get.return_value.status_code = 200
+        mock_get.return_value.json.return_value = {'data': {
+            'id': 43, 'email': 'u@example.com', 'name': 'u', 'is_staff': False, 'is_active': True,
+        }}
+        JWTAuthBackend().get_user({'user_id': 43, 'jti': 'no-read-retry'})
+        self.assertIs(mock_get.call_args[1]['retry_reads'], False)
+
+
+class CircuitBreakerTest(TestCase):
+    def setUp(self):
+        circuit_breaker._breakers.clear()
+        get_user_cache().clear()
+
+    def test_breaker_opens_and_recovers_through_half_open(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(breaker.trip_count, 1)
+
+        # recovery_timeout 为 0，下一次请求即进入半开状态，只放行一个试探请求
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_open_breaker_rejects_calls(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=60)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+        self.assertEqual(breaker.snapshot()['rejected_count'], 1)
+
+    @patch('accommodation.auth_backend.http_client.get')
+    def test_get_user_falls_back_to_claims_when_auth_service_is_down(self, mock_get):
+        mock_get.side_effect = RequestsConnectionError('auth_service down')
+        token = {'user_id': 9, 'email': 'down@example.com', 'name': 'down', 'is_staff': False, 'is_active': True}
+
+        user = JWTAuthBackend().get_user(token)
+
+        self.assertEqual(user.id, 9)
+        self.assertEqual(circuit_breaker.get_breaker('user_service').consecutive_failures, 1)
+
+    @patch('accommodation.event_shipper.http_client.post')
+    def test_unexpected_error_in_half_open_probe_reopens_breaker(self, mock_post):
+        breaker = circuit_breaker._breakers['logs_api'] = CircuitBreaker('logs_api', failure_threshold=1,
+                                                                         recovery_timeout=0)
+        breaker.record_failure()
+        mock_post.return_value.status_code = 201
+        mock_post.return_value.json.side_effect = ValueError('not JSON')
+
+        shipper = EventLogShipper('http://logs')
+        with self.assertRaises(ValueError):
+            shipper._send_batch([('create', {'activity': 'Accommodation List'}, {})])
+
+        self.assertEqual(breaker.state, 'open')
+        self.assertTrue(breaker.allow_request())
+
+    @patch('accommodation.auth_backend.http_client.get')
+    def test_unexpected_error_in_user_lookup_reopens_breaker(self, mock_get):
+        breaker = circuit_breaker._breakers['user_service'] = CircuitBreaker('user_service', failure_threshold=1,
+                                                                             recovery_timeout=0)
+        breaker.record_failure()
+        mock_get.side_effect = ValueError('bad URL')
+
+        with self.assertRaises(AuthenticationFailed):
+            JWTAuthBackend().get_user({'user_id': 9})
+
+        self.assertEqual(breaker.state, 'open')
+        self.assertTrue(breaker.allow_request())
+
+    def test_health_reports_breaker_state(self):
+        circuit_breaker.get_breaker('logs_api').record_failure()
+        response = self.client.get('/api/accommodation/health/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['circuit_breakers']['logs_api']['consecutive_failures'], 1)
+
+
+class AuditQueryPlansTest(TestCase):
+    def test_per_user_lists_use_indexes(self):
+        out = io.StringIO()
+        call_command('audit_query_plans', '--fail-on-scan', stdout=out, stderr=io.StringIO())
+        self.assertIn('0 filtered queries scan a whole table', out.getvalue())
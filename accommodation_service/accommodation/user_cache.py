@@ -0,0 +1,123 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """
+    TTL + LRU cache for user data fetched from auth_service.
+
+    Entries live in a per-process OrderedDict capped at ``max_size`` items. When
+    ``shared_alias`` names a Django cache (for example a Redis or file based cache
+    configured in CACHES), entries are also written there so other workers and
+    processes can skip the remote lookup too.
+    """
+
+    key_prefix = 'remote_user:'
+
+    def __init__(self, max_size=1024, ttl=300, shared_alias=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared_alias = shared_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, allow_stale=False):
+        """
+        Return cached user data or None. Expired local entries are kept until the LRU
+        evicts them, so ``allow_stale=True`` can still serve them while auth_service is down.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, user_data = entry
+                if expires_at > now or allow_stale:
+                    self._entries.move_to_end(key)
+                    return user_data
+
+        shared = self._shared_cache()
+        if shared is None:
+            return None
+        try:
+            user_data = shared.get(self.key_prefix + key)
+        except Exception as e:
+            logger.warning(f"Shared user cache read failed: {str(e)}")
+            return None
+        if user_data is not None:
+            self._set_local(key, user_data)
+        return user_data
+
+    def set(self, key, user_data):
+        self._set_local(key, user_data)
+        shared = self._shared_cache()
+        if shared is None:
+            return
+        try:
+            shared.set(self.key_prefix + key, user_data, timeout=self.ttl)
+        except Exception as e:
+            logger.warning(f"Shared user cache write failed: {str(e)}")
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        shared = self._shared_cache()
+        if shared is not None:
+            try:
+                shared.delete(self.key_prefix + key)
+            except Exception as e:
+                logger.warning(f"Shared user cache delete failed: {str(e)}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _set_local(self, key, user_data):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, user_data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _shared_cache(self):
+        if not self.shared_alias:
+            return None
+        return caches[self.shared_alias]
+
+
+def user_cache_key(validated_token):
+    """
+    Cache per user by default; with USER_CACHE_KEY = 'jti' every token gets its own entry,
+    so a freshly issued token always re-reads the user from auth_service.
+    """
+    if getattr(settings, 'USER_CACHE_KEY', 'user_id') == 'jti' and validated_token.get('jti'):
+        return f"jti:{validated_token['jti']}"
+    return f"user:{validated_token['user_id']}"
+
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    """
+    Return the process-wide user cache, or None when USER_CACHE_ENABLED is off.
+    """
+    global _user_cache
+    if not getattr(settings, 'USER_CACHE_ENABLED', True):
+        return None
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                _user_cache = UserCache(
+                    max_size=getattr(settings, 'USER_CACHE_MAX_SIZE', 1024),
+                    ttl=getattr(settings, 'USER_CACHE_TTL', 300),
+                    shared_alias=getattr(settings, 'USER_CACHE_ALIAS', None),
+                )
+    return _user_cache
@@ -1,14 +1,20 @@
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.views import APIView
-from .models import Accommodation, RoomType, RoomBooking, GuestService, FeedbackReview
+from .availability import available_accommodations, retry_on_lock_conflict
+from .circuit_breaker import breaker_snapshots
+from .search import search_accommodations
+from .models import Accommodation, RoomType, RoomBooking, GuestService, FeedbackReview, RoomUnavailable
 from .serializers import (
     AccommodationSerializer, RoomTypeSerializer, RoomBookingSerializer,
-    AccommodationCalculatePriceSerializer, GuestServiceSerializer, FeedbackReviewSerializer
+    AccommodationCalculatePriceSerializer, GuestServiceSerializer, FeedbackReviewSerializer,
+    AvailabilityQuerySerializer, AccommodationAvailabilitySerializer, AccommodationBatchCalculatePriceSerializer,
+    AccommodationSearchQuerySerializer, AccommodationSearchSerializer
 )
 from .permissions import IsAdminOrReadOnly, IsOwnerOrAdmin
 from rest_framework import viewsets
@@ -20,14 +26,57 @@ from django.conf import settings
 logger = logging.getLogger(__name__)
 
 
+class RoomUnavailableError(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "No room is left for the requested dates."
+    default_code = "room_unavailable"
+
+
+class AccommodationSearchPagination(PageNumberPagination):
+    page_size = 20  # 每页默认 20 家
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
 @extend_schema(tags=["AM - Accommodation"])
 class AccommodationViewSet(viewsets.ModelViewSet):
-    queryset = Accommodation.objects.all()
+    # 评分汇总随住宿一起查出，房型 ID 一次预取
+    queryset = Accommodation.objects.select_related('rating_summary').prefetch_related('types')
     serializer_class = AccommodationSerializer
     authentication_classes = [JWTAuthBackend]
     permission_classes = [IsAuthenticatedOrReadOnly]
     activity_name = "Accommodation"
 
+    @extend_schema(parameters=[AvailabilityQuerySerializer])
+    @action(detail=False, methods=["get"], url_path="availability", permission_classes=[AllowAny],
+            serializer_class=AccommodationAvailabilitySerializer)
+    def availability(self, request, *args, **kwargs):
+        """
+        Accommodations with a free room for every night of [check_in, check_out) and the room types that fit ``guests``
+        """
+        self.activity_name = "Search Room Availability"
+        params = AvailabilityQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        accommodations = available_accommodations(**params.validated_data)
+        serializer = self.get_serializer(accommodations, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @extend_schema(parameters=[AccommodationSearchQuerySerializer])
+    @action(detail=False, methods=["get"], url_path="search", permission_classes=[AllowAny],
+            serializer_class=AccommodationSearchSerializer, pagination_class=AccommodationSearchPagination)
+    def search(self, request, *args, **kwargs):
+        """
+        Filtered, sorted and paginated accommodations with their matching room types and cheapest price embedded
+        """
+        self.activity_name = "Search Accommodation"
+        params = AccommodationSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        page = self.paginate_queryset(search_accommodations(**params.validated_data))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def get_permissions(self):
         if settings.TESTING:
             return []
@@ -53,11 +102,21 @@ class RoomBookingViewSet(viewsets.ModelViewSet):
     queryset = RoomBooking.objects.all()
     serializer_class = RoomBookingSerializer
     permission_classes = [IsAuthenticated]
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [JWTAuthBackend]
     activity_name = "Room Booking"
 
     def perform_create(self, serializer):
-        serializer.save(user_id=self.request.user.id)
+        self.save_booking(serializer, user_id=self.request.user.id)
+
+    def perform_update(self, serializer):
+        self.save_booking(serializer)
+
+    def save_booking(self, serializer, **kwargs):
+        # 房晚库存在 RoomBooking.save 中原子占用，满房返回 409，锁冲突有限次重试
+        try:
+            retry_on_lock_conflict(lambda: serializer.save(**kwargs))
+        except RoomUnavailable as e:
+            raise RoomUnavailableError(str(e))
 
     def get_queryset(self):
         user = self.request.user
@@ -98,6 +157,62 @@ class RoomBookingViewSet(viewsets.ModelViewSet):
             "total_price": total_price,
         }, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=["post"], url_path="calculate-prices", permission_classes=[AllowAny],
+            serializer_class=AccommodationBatchCalculatePriceSerializer)
+    def calculate_prices(self, request, *args, **kwargs):
+        """
+        Quote a list of (accommodation, room, days) tuples in one request; every quote carries its own status
+        """
+        self.activity_name = "Calculate Room Prices"
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({"quotes": self.build_quotes(serializer.validated_data["quotes"])}, status=status.HTTP_200_OK)
+
+    def build_quotes(self, items):
+        """
+        Resolve all accommodations with one id__in query and all offered room types with another,
+        then price every item in memory, in request order
+        """
+        parsed = [AccommodationCalculatePriceSerializer(data=item) for item in items]
+        valid = [quote.validated_data for quote in parsed if quote.is_valid()]
+
+        accommodations, offered = {}, {}
+        if valid:
+            accommodations = Accommodation.objects.in_bulk({quote["accommodation_id"] for quote in valid})
+            links = Accommodation.types.through.objects.filter(
+                accommodation_id__in=accommodations, roomtype_id__in={quote["room_id"] for quote in valid},
+            ).select_related("roomtype")
+            offered = {(link.accommodation_id, link.roomtype_id): link.roomtype for link in links}
+
+        quotes = []
+        for item, quote in zip(items, parsed):
+            result = {field: item.get(field) for field in ("accommodation_id", "room_id", "number_of_days")}
+            if quote.errors:
+                quotes.append({**result, "status": status.HTTP_400_BAD_REQUEST, "errors": quote.errors})
+                continue
+
+            accommodation_id = quote.validated_data["accommodation_id"]
+            room_id = quote.validated_data["room_id"]
+            number_of_days = quote.validated_data["number_of_days"]
+            accommodation = accommodations.get(accommodation_id)
+            room = offered.get((accommodation_id, room_id))
+            if accommodation is None:
+                detail = f"Accommodation with id {accommodation_id} does not exist."
+            elif room is None:
+                detail = f"Room with id {room_id} is not available for this accommodation."
+            else:
+                quotes.append({
+                    **result,
+                    "status": status.HTTP_200_OK,
+                    "accommodation": accommodation.name,
+                    "room_type": room.room_type,
+                    "price_per_night": room.price_per_night,
+                    "total_price": room.price_per_night * number_of_days,
+                })
+                continue
+            quotes.append({**result, "status": status.HTTP_404_NOT_FOUND, "detail": detail})
+        return quotes
+
     def get_permissions(self):
         if settings.TESTING:
             return []
@@ -136,7 +251,7 @@ class GuestServiceViewSet(viewsets.ModelViewSet):
 class FeedbackReviewViewSet(viewsets.ModelViewSet):
     queryset = FeedbackReview.objects.all()
     serializer_class = FeedbackReviewSerializer
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [JWTAuthBackend]
     permission_classes = [IsAuthenticatedOrReadOnly]
     activity_name = "Feedback Review"
 
@@ -190,4 +305,5 @@ class HealthView(APIView):
         responses={200: {"description": "Service is healthy"}},
     )
     def get(self, request):
-        return Response({"status": "ok"}, status=status.HTTP_200_OK)
+        # 附带熔断器状态和触发次数，便于监控对 auth_service 的依赖
+        return Response({"status": "ok", "circuit_breakers": breaker_snapshots()}, status=status.HTTP_200_OK)
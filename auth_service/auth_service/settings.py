@@ -216,6 +216,20 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# 事件日志批量写入配置
+EVENT_LOG_BULK_CHUNK_SIZE = int(os.environ.get('EVENT_LOG_BULK_CHUNK_SIZE', 500))  # 每条 INSERT 语句的行数
+EVENT_LOG_BULK_MAX_EVENTS = int(os.environ.get('EVENT_LOG_BULK_MAX_EVENTS', 10000))  # 单次请求最多事件数
+EVENT_LOG_EXPORT_CHUNK_SIZE = int(os.environ.get('EVENT_LOG_EXPORT_CHUNK_SIZE', 2000))  # 导出时每次从游标读取的行数
+PROCESS_MINING_CACHE_TTL = int(os.environ.get('PROCESS_MINING_CACHE_TTL', 300))  # 流程挖掘结果按时间窗口缓存的秒数
+# 事件日志保留策略：过期数据先归档为 gzip NDJSON，再分块删除
+EVENT_LOG_RETENTION_DAYS = int(os.environ.get('EVENT_LOG_RETENTION_DAYS', 90))
+EVENT_LOG_ARCHIVE_DIR = os.environ.get('EVENT_LOG_ARCHIVE_DIR', os.path.join(BASE_DIR, 'event_log_archive'))  # 为空则不归档
+EVENT_LOG_DELETE_CHUNK_SIZE = int(os.environ.get('EVENT_LOG_DELETE_CHUNK_SIZE', 5000))  # 每条 DELETE 语句删除的行数
+# 仅 PostgreSQL：事件表已改建为按月分区时，过期的整月分区直接 DROP
+EVENT_LOG_MONTHLY_PARTITIONS = os.environ.get('EVENT_LOG_MONTHLY_PARTITIONS', 'False') == 'True'
+# 批量日志请求体可能超过默认的 2.5MB 限制
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024
+
 # 添加这行来检测是否在测试模式
 TESTING = 'test' in sys.argv
 
@@ -0,0 +1,261 @@
+import csv
+import io
+import zlib
+from array import array
+from itertools import groupby
+from operator import itemgetter
+from xml.sax.saxutils import XMLGenerator
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow 为可选依赖，未安装时只提供 NPZ 格式
+    pa = None
+    pq = None
+
+# (model field, CSV header) in export order
+CSV_COLUMNS = (
+    ('case_id', 'Case_id'),
+    ('activity', 'Activity'),
+    ('start_time', 'Start Date'),
+    ('end_time', 'End Date'),
+    ('user_id', 'User_id'),
+    ('user_name', 'User_name'),
+)
+CSV_DATE_FORMAT = '%-d.%-m.%y %H:%M'
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line back instead of buffering it,
+    so csv.writer can be driven from a generator.
+    """
+
+    def write(self, value):
+        return value
+
+
+def format_timestamp(value, date_format=CSV_DATE_FORMAT):
+    return value.strftime(date_format) if value is not None else ''
+
+
+def iter_event_rows(queryset, fields, chunk_size=None):
+    """
+    Yield event logs as value tuples through a server-side cursor, ``chunk_size`` rows per fetch.
+    """
+    chunk_size = chunk_size or getattr(settings, 'EVENT_LOG_EXPORT_CHUNK_SIZE', 2000)
+    return queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def iter_csv(queryset, chunk_size=None):
+    """
+    Generate the event log CSV line by line; memory use does not depend on the table size.
+    """
+    writer = csv.writer(Echo())
+    fields = [field for field, _ in CSV_COLUMNS]
+    start_index, end_index = fields.index('start_time'), fields.index('end_time')
+
+    yield writer.writerow([header for _, header in CSV_COLUMNS])
+    for row in iter_event_rows(queryset, fields, chunk_size):
+        row = list(row)
+        row[start_index] = format_timestamp(row[start_index])
+        row[end_index] = format_timestamp(row[end_index])
+        yield writer.writerow(row)
+
+
+# Columnar exports: strings are dictionary-encoded, timestamps are int64 microseconds
+# since the Unix epoch (UTC), and missing integers / timestamps are stored as NULL_INT64.
+COLUMNAR_FIELDS = ('case_id', 'activity', 'start_time', 'end_time', 'user_id', 'user_name', 'status_code')
+DICTIONARY_FIELDS = ('case_id', 'activity', 'user_name')
+TIMESTAMP_FIELDS = ('start_time', 'end_time')
+NULL_INT64 = np.iinfo(np.int64).min
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ONE_MICROSECOND = timedelta(microseconds=1)
+
+FORMAT_NPZ = 'npz'
+FORMAT_PARQUET = 'parquet'
+COLUMNAR_CONTENT_TYPES = {
+    FORMAT_NPZ: 'application/octet-stream',
+    FORMAT_PARQUET: 'application/vnd.apache.parquet',
+}
+
+
+def columnar_formats():
+    return (FORMAT_PARQUET, FORMAT_NPZ) if pq is not None else (FORMAT_NPZ,)
+
+
+def to_epoch_micros(value):
+    return NULL_INT64 if value is None else (value - EPOCH) // ONE_MICROSECOND
+
+
+def write_columnar(queryset, fileobj, file_format, chunk_size=None):
+    """
+    Write the event log in a columnar format to ``fileobj``; returns the number of rows.
+    """
+    if file_format == FORMAT_PARQUET:
+        if pq is None:
+            raise ValueError('Parquet export requires pyarrow.')
+        return write_parquet(queryset, fileobj, chunk_size)
+    if file_format == FORMAT_NPZ:
+        return write_npz(queryset, fileobj, chunk_size)
+    raise ValueError(f"Unknown columnar format: {file_format}")
+
+
+def write_npz(queryset, fileobj, chunk_size=None):
+    """
+    Dictionary-encoded NPZ: for each string column ``<name>_codes`` (int32, -1 = null) and
+    ``<name>_values`` (the dictionary); other columns are int64 arrays.
+    Rows are read from a DB iterator and appended to compact typed arrays.
+    """
+    dictionaries = {field: {} for field in DICTIONARY_FIELDS}
+    columns = {field: array('i' if field in DICTIONARY_FIELDS else 'q') for field in COLUMNAR_FIELDS}
+    encoders = [_column_encoder(field, dictionaries) for field in COLUMNAR_FIELDS]
+
+    for row in iter_event_rows(queryset, COLUMNAR_FIELDS, chunk_size):
+        for field, encode, value in zip(COLUMNAR_FIELDS, encoders, row):
+            columns[field].append(encode(value))
+
+    arrays = {}
+    for field in COLUMNAR_FIELDS:
+        if field in DICTIONARY_FIELDS:
+            arrays[f'{field}_codes'] = np.frombuffer(columns[field], dtype=np.int32)
+            arrays[f'{field}_values'] = np.array(list(dictionaries[field]), dtype=str)
+        else:
+            arrays[field] = np.frombuffer(columns[field], dtype=np.int64)
+    np.savez_compressed(fileobj, **arrays)
+    return len(columns['case_id'])
+
+
+def _column_encoder(field, dictionaries):
+    if field in DICTIONARY_FIELDS:
+        dictionary = dictionaries[field]
+
+        def encode(value):
+            if value is None:
+                return -1
+            code = dictionary.get(value)
+            if code is None:
+                code = dictionary[value] = len(dictionary)
+            return code
+        return encode
+    if field in TIMESTAMP_FIELDS:
+        return to_epoch_micros
+    return lambda value: NULL_INT64 if value is None else value
+
+
+def write_parquet(queryset, fileobj, chunk_size=None):
+    """
+    Parquet with one row group per DB chunk, so only one chunk is held in memory.
+    """
+    chunk_size = chunk_size or getattr(settings, 'EVENT_LOG_EXPORT_CHUNK_SIZE', 2000)
+    schema = pa.schema([
+        ('case_id', pa.dictionary(pa.int32(), pa.string())),
+        ('activity', pa.dictionary(pa.int32(), pa.string())),
+        ('start_time', pa.timestamp('us', tz='UTC')),
+        ('end_time', pa.timestamp('us', tz='UTC')),
+        ('user_id', pa.int64()),
+        ('user_name', pa.dictionary(pa.int32(), pa.string())),
+        ('status_code', pa.int64()),
+    ])
+    rows = 0
+    chunk = []
+    with pq.ParquetWriter(fileobj, schema, use_dictionary=list(DICTIONARY_FIELDS), compression='snappy') as writer:
+        for row in iter_event_rows(queryset, COLUMNAR_FIELDS, chunk_size):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                writer.write_table(_parquet_table(chunk, schema))
+                rows += len(chunk)
+                chunk = []
+        if chunk or not rows:
+            writer.write_table(_parquet_table(chunk, schema))
+            rows += len(chunk)
+    return rows
+
+
+def _parquet_table(chunk, schema):
+    columns = list(zip(*chunk)) if chunk else [()] * len(COLUMNAR_FIELDS)
+    arrays = []
+    for field, values in zip(COLUMNAR_FIELDS, columns):
+        if field in DICTIONARY_FIELDS:
+            arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=schema.field(field).type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+XES_FIELDS = ('case_id', 'activity', 'start_time', 'end_time', 'user_name', 'status_code')
+XES_EXTENSIONS = (
+    ('Concept', 'concept', 'http://www.xes-standard.org/concept.xesext'),
+    ('Time', 'time', 'http://www.xes-standard.org/time.xesext'),
+    ('Lifecycle', 'lifecycle', 'http://www.xes-standard.org/lifecycle.xesext'),
+    ('Organizational', 'org', 'http://www.xes-standard.org/org.xesext'),
+)
+XES_FLUSH_BYTES = 64 * 1024
+
+
+def iter_xes(queryset, chunk_size=None):
+    """
+    Generate an XES document incrementally: one <trace> per case_id, one <event> per row.
+    The queryset is read ordered by (case_id, start_time) so every trace is contiguous;
+    output is handed out in ~64 KB pieces.
+    """
+    buffer = io.StringIO()
+    xml = XMLGenerator(buffer, encoding='utf-8', short_empty_elements=True)
+    xml.startDocument()
+    xml.startElement('log', {'xes.version': '1.0', 'xes.features': 'nested-attributes'})
+    for name, prefix, uri in XES_EXTENSIONS:
+        _xes_element(xml, 'extension', {'name': name, 'prefix': prefix, 'uri': uri})
+    _xes_element(xml, 'classifier', {'name': 'Activity', 'keys': 'concept:name'})
+
+    rows = iter_event_rows(queryset.order_by('case_id', 'start_time', 'id'), XES_FIELDS, chunk_size)
+    for case_id, events in groupby(rows, key=itemgetter(0)):
+        xml.startElement('trace', {})
+        _xes_element(xml, 'string', {'key': 'concept:name', 'value': case_id})
+        for _, activity, start_time, end_time, user_name, status_code in events:
+            xml.startElement('event', {})
+            _xes_element(xml, 'string', {'key': 'concept:name', 'value': activity})
+            _xes_element(xml, 'date', {'key': 'time:timestamp', 'value': start_time.isoformat()})
+            if end_time is not None:
+                _xes_element(xml, 'date', {'key': 'time:endTimestamp', 'value': end_time.isoformat()})
+            _xes_element(xml, 'string', {'key': 'lifecycle:transition', 'value': 'complete'})
+            if user_name:
+                _xes_element(xml, 'string', {'key': 'org:resource', 'value': user_name})
+            if status_code is not None:
+                _xes_element(xml, 'int', {'key': 'status', 'value': str(status_code)})
+            xml.endElement('event')
+            # 在事件之间检查，一个很长的 trace 也不会整条攒在内存里
+            if buffer.tell() >= XES_FLUSH_BYTES:
+                yield _drain(buffer)
+        xml.endElement('trace')
+
+    xml.endElement('log')
+    xml.endDocument()
+    yield _drain(buffer)
+
+
+def _xes_element(xml, name, attrs):
+    xml.startElement(name, attrs)
+    xml.endElement(name)
+
+
+def _drain(buffer):
+    data = buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+def gzip_stream(chunks, level=6):
+    """
+    Gzip a byte stream on the fly.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
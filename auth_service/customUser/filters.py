@@ -0,0 +1,78 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+# Query parameter -> lookup for the exact-match filters
+EXACT_FILTERS = {
+    'case_id': 'case_id',
+    'activity': 'activity',
+    'user_id': 'user_id',
+    'status_code': 'status_code',
+    'service': 'service',
+}
+INTEGER_FILTERS = ('user_id', 'status_code')
+FILTER_PARAMS = ('start_time', 'end_time') + tuple(EXACT_FILTERS)
+
+
+def parse_time_param(name, value):
+    """
+    Accept an ISO 8601 datetime or a plain date; naive values are read in the current time zone.
+    """
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is not None:
+            parsed = timezone.datetime(date.year, date.month, date.day)
+    if parsed is None:
+        raise ValidationError({name: f"'{value}' is not a valid ISO 8601 date or datetime."})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def filter_rollups(queryset, params):
+    """
+    Filters of the rollup API: ``start_time`` / ``end_time`` bound ``bucket_start``;
+    ``service``, ``activity`` and ``status_code`` are exact matches.
+    """
+    if params.get('start_time'):
+        queryset = queryset.filter(bucket_start__gte=parse_time_param('start_time', params['start_time']))
+    if params.get('end_time'):
+        queryset = queryset.filter(bucket_start__lt=parse_time_param('end_time', params['end_time']))
+    if params.get('service'):
+        queryset = queryset.filter(service=params['service'])
+    if params.get('activity'):
+        queryset = queryset.filter(activity=params['activity'])
+    if params.get('status_code'):
+        try:
+            queryset = queryset.filter(status_code=int(params['status_code']))
+        except ValueError:
+            raise ValidationError({'status_code': f"'{params['status_code']}' is not a valid integer."})
+    return queryset
+
+
+def filter_event_logs(queryset, params):
+    """
+    Apply the event log filters from query parameters; everything is pushed down to SQL.
+
+    ``start_time`` / ``end_time`` bound the window the events *started* in
+    (start_time <= event.start_time < end_time), so an incremental export can pull
+    exactly the last hour with the (start_time) index. ``case_id``, ``activity``,
+    ``user_id`` and ``status_code`` are exact matches.
+    """
+    if params.get('start_time'):
+        queryset = queryset.filter(start_time__gte=parse_time_param('start_time', params['start_time']))
+    if params.get('end_time'):
+        queryset = queryset.filter(start_time__lt=parse_time_param('end_time', params['end_time']))
+
+    for param, lookup in EXACT_FILTERS.items():
+        value = params.get(param)
+        if value in (None, ''):
+            continue
+        if param in INTEGER_FILTERS:
+            try:
+                value = int(value)
+            except ValueError:
+                raise ValidationError({param: f"'{value}' is not a valid integer."})
+        queryset = queryset.filter(**{lookup: value})
+    return queryset
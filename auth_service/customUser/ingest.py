@@ -0,0 +1,192 @@
+import json
+import uuid
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import EventLog
+from .rollups import lock_for_write, record_rollups
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+# SQLite 不限制整数列的范围，但最多只能存有符号 64 位整数
+INTEGER_COLUMN_RANGE = (-2 ** 63, 2 ** 63 - 1)
+
+
+class EventPayloadError(ValueError):
+    """
+    Raised when a bulk event payload cannot be decoded at all
+    """
+
+
+def parse_event_payload(body, content_type):
+    """
+    Decode a bulk payload: either a JSON array of events or NDJSON (one event per line).
+    """
+    try:
+        text = body.decode('utf-8')
+    except UnicodeDecodeError:
+        raise EventPayloadError('Payload is not valid UTF-8.')
+
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type not in NDJSON_CONTENT_TYPES and text.lstrip().startswith('['):
+        try:
+            rows = json.loads(text)
+        except ValueError as e:
+            raise EventPayloadError(f'Invalid JSON array: {e}')
+        if not isinstance(rows, list):
+            raise EventPayloadError('Expected a JSON array of events.')
+        return rows
+
+    rows = []
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            rows.append(json.loads(line))
+        except ValueError as e:
+            raise EventPayloadError(f'Invalid JSON on line {line_number}: {e}')
+    return rows
+
+
+def _parse_time(value, field, errors, required):
+    if value in (None, ''):
+        if required:
+            errors[field] = 'This field is required.'
+        return None
+    try:
+        parsed = parse_datetime(value) if isinstance(value, str) else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        errors[field] = 'Invalid datetime.'
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+def _parse_text(value, field, errors, required, max_length=255):
+    if value in (None, ''):
+        if required:
+            errors[field] = 'This field is required.'
+        return None
+    value = str(value)
+    if len(value) > max_length:
+        errors[field] = f'Ensure this field has no more than {max_length} characters.'
+        return None
+    return value
+
+
+def _integer_range(field):
+    internal_type = EventLog._meta.get_field(field).get_internal_type()
+    min_value, max_value = connection.ops.integer_field_range(internal_type)
+    return (
+        INTEGER_COLUMN_RANGE[0] if min_value is None else min_value,
+        INTEGER_COLUMN_RANGE[1] if max_value is None else max_value,
+    )
+
+
+def _parse_int(value, field, errors, required):
+    if value in (None, ''):
+        if required:
+            errors[field] = 'This field is required.'
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        errors[field] = 'A valid integer is required.'
+        return None
+    # 超出列范围的值会让 bulk_create 整批失败
+    min_value, max_value = _integer_range(field)
+    if value < min_value:
+        errors[field] = f'Ensure this value is greater than or equal to {min_value}.'
+        return None
+    if value > max_value:
+        errors[field] = f'Ensure this value is less than or equal to {max_value}.'
+        return None
+    return value
+
+
+def build_event_log(row):
+    """
+    Validate one event without a serializer instance.
+    Returns (EventLog, None) on success or (None, errors) on failure.
+    """
+    if not isinstance(row, dict):
+        return None, {'non_field_errors': 'Expected a JSON object.'}
+
+    errors = {}
+    event_id = row.get('event_id')
+    if event_id not in (None, ''):
+        try:
+            event_id = uuid.UUID(str(event_id))
+        except ValueError:
+            errors['event_id'] = 'Must be a valid UUID.'
+    else:
+        event_id = None
+
+    event = EventLog(
+        event_id=event_id,
+        case_id=_parse_text(row.get('case_id'), 'case_id', errors, required=True),
+        activity=_parse_text(row.get('activity'), 'activity', errors, required=True),
+        start_time=_parse_time(row.get('start_time'), 'start_time', errors, required=True),
+        end_time=_parse_time(row.get('end_time'), 'end_time', errors, required=False),
+        user_id=_parse_int(row.get('user_id'), 'user_id', errors, required=False),
+        user_name=_parse_text(row.get('user_name'), 'user_name', errors, required=False),
+        status_code=_parse_int(row.get('status_code'), 'status_code', errors, required=False),
+        service=_parse_text(row.get('service'), 'service', errors, required=False, max_length=64) or '',
+    )
+    if errors:
+        return None, errors
+    return event, None
+
+
+def bulk_ingest_events(rows):
+    """
+    Validate a list of raw events and insert the valid ones with bulk_create in a single transaction.
+    Rows whose event_id already exists are skipped, so a retried batch does not duplicate events.
+    Returns (accepted_events, errors) where errors is a list of {"index", "errors"} dicts.
+    """
+    events = []
+    errors = []
+    for index, row in enumerate(rows):
+        event, row_errors = build_event_log(row)
+        if row_errors:
+            errors.append({'index': index, 'errors': row_errors})
+        else:
+            events.append(event)
+
+    if events:
+        chunk_size = getattr(settings, 'EVENT_LOG_BULK_CHUNK_SIZE', 500)
+        with transaction.atomic():
+            # 先取得写锁再查询已存在的 event_id，避免 SQLite 读锁升级失败
+            lock_for_write()
+            new_events = exclude_stored_events(events, chunk_size)
+            EventLog.objects.bulk_create(events, batch_size=chunk_size, ignore_conflicts=True)
+            record_rollups(new_events)
+    return events, errors
+
+
+def exclude_stored_events(events, chunk_size=500):
+    """
+    Drop events whose event_id is already stored (or repeated in the batch), so a retried
+    batch is not counted twice in the rollups.
+    """
+    event_ids = [event.event_id for event in events if event.event_id is not None]
+    stored = set()
+    for start in range(0, len(event_ids), chunk_size):
+        stored.update(EventLog.objects.filter(event_id__in=event_ids[start:start + chunk_size])
+                      .values_list('event_id', flat=True))
+
+    new_events = []
+    for event in events:
+        if event.event_id is not None:
+            if event.event_id in stored:
+                continue
+            stored.add(event.event_id)
+        new_events.append(event)
+    return new_events
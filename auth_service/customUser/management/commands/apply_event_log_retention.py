@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from customUser.retention import apply_retention, ensure_month_partitions
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete event logs older than the retention period (run daily, e.g. from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.EVENT_LOG_RETENTION_DAYS,
+                            help='Keep events that started within this many days')
+        parser.add_argument('--archive-dir', default=None,
+                            help='Directory for gzip NDJSON archives; an empty string disables archiving')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be removed')
+        parser.add_argument('--ensure-partitions', type=int, default=None, metavar='MONTHS',
+                            help='Also create monthly partitions this many months ahead (PostgreSQL only)')
+
+    def handle(self, *args, **options):
+        if options['ensure_partitions'] is not None:
+            for name in ensure_month_partitions(options['ensure_partitions']):
+                self.stdout.write(f"Partition ready: {name}")
+
+        windows = apply_retention(retention_days=options['days'], archive_dir=options['archive_dir'],
+                                  dry_run=options['dry_run'])
+        for window in windows:
+            action = 'Would delete' if options['dry_run'] else 'Deleted'
+            line = f"{action} {window['deleted']} events from {window['start']:%Y-%m-%d} to {window['end']:%Y-%m-%d}"
+            if window['path']:
+                line += f" (archived to {window['path']})"
+            self.stdout.write(line)
+        total = sum(window['deleted'] for window in windows)
+        self.stdout.write(self.style.SUCCESS(f"Retention finished, {total} events past {options['days']} days"))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from customUser.exports import columnar_formats, write_columnar
+from customUser.filters import filter_event_logs
+from customUser.models import EventLog
+
+
+class Command(BaseCommand):
+    help = 'Export the event log to a columnar file (Parquet or dictionary-encoded NPZ).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the file to write')
+        parser.add_argument('--format', dest='file_format', choices=columnar_formats(), default=columnar_formats()[0])
+        parser.add_argument('--start-time', help='Only events that started at or after this ISO 8601 time')
+        parser.add_argument('--end-time', help='Only events that started before this ISO 8601 time')
+        parser.add_argument('--case-id')
+        parser.add_argument('--activity')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Rows fetched per database round trip')
+
+    def handle(self, *args, **options):
+        params = {
+            'start_time': options['start_time'],
+            'end_time': options['end_time'],
+            'case_id': options['case_id'],
+            'activity': options['activity'],
+        }
+        try:
+            events = filter_event_logs(EventLog.objects.order_by('id'), params)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        with open(options['output'], 'wb') as output:
+            rows = write_columnar(events, output, options['file_format'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Exported {rows} event logs to {options['output']}"))
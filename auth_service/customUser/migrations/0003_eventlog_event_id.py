@@ -0,0 +1,18 @@
+# Generated by Django 3.2.10 on 2026-10-17 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customUser', '0002_remove_eventlog_user_eventlog_user_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventlog',
+            name='event_id',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.10 on 2026-10-17 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customUser', '0003_eventlog_event_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='eventlog',
+            name='user_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
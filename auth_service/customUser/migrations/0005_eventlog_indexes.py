@@ -0,0 +1,25 @@
+# Generated by Django 3.2.10 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customUser', '0004_eventlog_user_id_nullable'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['start_time'], name='eventlog_start_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['case_id', 'start_time'], name='eventlog_case_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['activity', 'start_time'], name='eventlog_activity_start_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.10 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customUser', '0005_eventlog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventlog',
+            index=models.Index(fields=['start_time', 'id'], name='eventlog_start_time_id_idx'),
+        ),
+    ]
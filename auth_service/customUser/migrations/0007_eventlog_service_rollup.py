@@ -0,0 +1,38 @@
+# Generated by Django 3.2.10 on 2026-10-17 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customUser', '0006_eventlog_start_time_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventLogRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('service', models.CharField(blank=True, default='', max_length=64)),
+                ('activity', models.CharField(max_length=255)),
+                ('status_code', models.IntegerField(default=0)),
+                ('count', models.BigIntegerField(default=0)),
+                ('latency_count', models.BigIntegerField(default=0)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('latency_min', models.FloatField(blank=True, null=True)),
+                ('latency_max', models.FloatField(blank=True, null=True)),
+                ('latency_histogram', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='eventlog',
+            name='service',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddConstraint(
+            model_name='eventlogrollup',
+            constraint=models.UniqueConstraint(fields=('bucket_start', 'service', 'activity', 'status_code'), name='eventlog_rollup_unique'),
+        ),
+    ]
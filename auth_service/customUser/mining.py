@@ -0,0 +1,197 @@
+import hashlib
+import json
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+
+from .exports import iter_event_rows
+
+# Upper bounds (seconds) of the fixed duration histogram buckets; the last bucket is open-ended
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600, 21600, 86400)
+_BUCKET_EDGES = np.array(DURATION_BUCKETS)
+MINING_FIELDS = ('case_id', 'activity', 'start_time', 'end_time')
+
+
+def bucket_index(seconds):
+    """
+    Map durations (scalar or array, seconds) to their histogram bucket.
+    """
+    return np.searchsorted(_BUCKET_EDGES, seconds, side='left')
+
+
+def histogram_quantile(counts, q, maximum=None):
+    """
+    Approximate quantile from bucket counts: the upper bound of the bucket holding the q-th
+    observation. Observations in the open-ended last bucket are reported as ``maximum``.
+    """
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    for index, count in enumerate(counts):
+        cumulative += count
+        if cumulative >= rank and count:
+            if index < len(DURATION_BUCKETS):
+                bound = DURATION_BUCKETS[index]
+                return min(bound, maximum) if maximum is not None else bound
+            return maximum
+    return maximum
+
+
+class DurationStats:
+    """
+    count / sum / max plus a fixed-bucket histogram, mergeable across chunks.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = None
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+
+    def add_array(self, seconds):
+        if not len(seconds):
+            return
+        self.count += len(seconds)
+        self.total += float(seconds.sum())
+        chunk_max = float(seconds.max())
+        self.maximum = chunk_max if self.maximum is None else max(self.maximum, chunk_max)
+        for index, count in zip(*np.unique(bucket_index(seconds), return_counts=True)):
+            self.buckets[index] += int(count)
+
+    def as_dict(self, prefix):
+        return {
+            f'mean_{prefix}_seconds': self.total / self.count if self.count else None,
+            f'p50_{prefix}_seconds': histogram_quantile(self.buckets, 0.5, self.maximum),
+            f'p95_{prefix}_seconds': histogram_quantile(self.buckets, 0.95, self.maximum),
+            f'max_{prefix}_seconds': self.maximum,
+        }
+
+
+class ProcessMiningAggregator:
+    """
+    Directly-follows graph, per-activity duration histograms and variant frequencies,
+    computed chunk by chunk over events ordered by (case_id, start_time).
+
+    Each chunk is processed with vectorised numpy/pandas operations. The last event of a
+    chunk is carried into the next one so transitions that cross a chunk boundary are
+    counted, and the activity sequence of the case still open at the boundary is kept
+    until the case ends.
+    """
+
+    def __init__(self):
+        self.events = 0
+        self.cases = 0
+        self.transitions = defaultdict(DurationStats)
+        self.durations = defaultdict(DurationStats)
+        self.variants = Counter()
+        self._carry = None
+        self._open_case = None
+        self._open_sequence = []
+
+    def add_chunk(self, rows):
+        if not rows:
+            return
+        frame = pd.DataFrame(rows, columns=MINING_FIELDS)
+        frame['start_time'] = pd.to_datetime(frame['start_time'], utc=True)
+        frame['end_time'] = pd.to_datetime(frame['end_time'], utc=True)
+        self.events += len(frame)
+        self._add_durations(frame)
+        self._add_transitions(frame)
+        self._add_variants(frame)
+
+    def finish(self):
+        if self._open_case is not None:
+            self.variants[tuple(self._open_sequence)] += 1
+            self.cases += 1
+            self._open_case = None
+            self._open_sequence = []
+
+    def _add_durations(self, frame):
+        seconds = (frame['end_time'] - frame['start_time']).dt.total_seconds()
+        ended = seconds.notna()
+        for activity, values in seconds[ended].groupby(frame['activity'][ended]):
+            self.durations[activity].add_array(values.to_numpy())
+
+    def _add_transitions(self, frame):
+        window = frame[['case_id', 'activity', 'start_time']]
+        if self._carry is not None:
+            window = pd.concat([self._carry, window], ignore_index=True)
+        self._carry = window.iloc[[-1]]
+
+        cases = window['case_id'].to_numpy()
+        same_case = cases[1:] == cases[:-1]
+        sources = window['activity'].to_numpy()[:-1][same_case]
+        targets = window['activity'].to_numpy()[1:][same_case]
+        gaps = window['start_time'].diff().dt.total_seconds().to_numpy()[1:][same_case]
+
+        pairs = pd.DataFrame({'source': sources, 'target': targets, 'gap': gaps})
+        for (source, target), group in pairs.groupby(['source', 'target'], sort=False):
+            self.transitions[(source, target)].add_array(group['gap'].to_numpy())
+
+    def _add_variants(self, frame):
+        sequences = frame.groupby('case_id', sort=False)['activity'].agg(list)
+        for case_id, sequence in sequences.items():
+            if case_id == self._open_case:
+                self._open_sequence.extend(sequence)
+                continue
+            self.finish()
+            self._open_case = case_id
+            self._open_sequence = list(sequence)
+
+    def result(self, max_variants=20):
+        self.finish()
+        return {
+            'events': self.events,
+            'cases': self.cases,
+            'duration_buckets': list(DURATION_BUCKETS),
+            'dfg': [
+                {'source': source, 'target': target, 'count': stats.count, **stats.as_dict('transition')}
+                for (source, target), stats in sorted(self.transitions.items(), key=lambda item: -item[1].count)
+            ],
+            'activities': [
+                {'activity': activity, 'count': stats.count, **stats.as_dict('duration'),
+                 'histogram': stats.buckets}
+                for activity, stats in sorted(self.durations.items())
+            ],
+            'variant_count': len(self.variants),
+            'variants': [
+                {'activities': list(sequence), 'count': count}
+                for sequence, count in self.variants.most_common(max_variants)
+            ],
+        }
+
+
+def compute_process_mining(queryset, chunk_size=None, max_variants=20):
+    chunk_size = chunk_size or getattr(settings, 'EVENT_LOG_EXPORT_CHUNK_SIZE', 2000)
+    aggregator = ProcessMiningAggregator()
+    rows = iter_event_rows(queryset.order_by('case_id', 'start_time', 'id'), MINING_FIELDS, chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            aggregator.add_chunk(chunk)
+            chunk = []
+    aggregator.add_chunk(chunk)
+    return aggregator.result(max_variants=max_variants)
+
+
+def process_mining_cache_key(params):
+    """
+    One cache entry per filter window: the key is a hash of the normalised query parameters.
+    """
+    normalised = json.dumps(sorted(params.items()))
+    return f"process_mining:{hashlib.sha256(normalised.encode('utf-8')).hexdigest()}"
+
+
+def cached_process_mining(queryset, params, max_variants=20):
+    key = process_mining_cache_key({**params, 'max_variants': max_variants})
+    result = cache.get(key)
+    if result is None:
+        result = compute_process_mining(queryset, max_variants=max_variants)
+        cache.set(key, result, timeout=getattr(settings, 'PROCESS_MINING_CACHE_TTL', 300))
+    return result
@@ -47,13 +47,51 @@ class EventLog(models.Model):
     """
     Model for storing request and response event log data
     """
+    event_id = models.UUIDField(unique=True, null=True, blank=True)  # Client-generated ID, makes retries idempotent
     case_id = models.CharField(max_length=255)  # Session ID or business process ID
     activity = models.CharField(max_length=255)  # Activity name or operation description
     start_time = models.DateTimeField()  # Request start time
     end_time = models.DateTimeField(null=True, blank=True)  # Request end time
-    user_id = models.IntegerField()
+    user_id = models.IntegerField(null=True, blank=True)  # Null for anonymous requests
     user_name = models.CharField(max_length=255, null=True, blank=True)  # User's name or username
     status_code = models.IntegerField(null=True, blank=True)  # Status code (for response)
+    service = models.CharField(max_length=64, blank=True, default='')  # Service that recorded the event
+
+    class Meta:
+        # Backs the start_time window and case/activity filters of the list and export endpoints
+        indexes = [
+            models.Index(fields=['start_time'], name='eventlog_start_time_idx'),
+            models.Index(fields=['case_id', 'start_time'], name='eventlog_case_start_idx'),
+            models.Index(fields=['activity', 'start_time'], name='eventlog_activity_start_idx'),
+            # Keyset pagination of the list endpoint
+            models.Index(fields=['start_time', 'id'], name='eventlog_start_time_id_idx'),
+        ]
 
     def __str__(self):
         return f"Case ID: {self.case_id}, Activity: {self.activity}, Start Time: {self.start_time}, End Time: {self.end_time}, User_id: {self.user_id}, User Name: {self.user_name}, Status: {self.status_code}"
+
+
+class EventLogRollup(models.Model):
+    """
+    Per-minute aggregate of EventLog rows per activity, service and status code,
+    maintained as events are ingested
+    """
+    bucket_start = models.DateTimeField()  # Start of the minute
+    service = models.CharField(max_length=64, blank=True, default='')
+    activity = models.CharField(max_length=255)
+    status_code = models.IntegerField(default=0)  # 0 when the event has no status code
+    count = models.BigIntegerField(default=0)  # Number of events
+    latency_count = models.BigIntegerField(default=0)  # Events with an end_time
+    latency_sum = models.FloatField(default=0)  # Seconds
+    latency_min = models.FloatField(null=True, blank=True)
+    latency_max = models.FloatField(null=True, blank=True)
+    latency_histogram = models.JSONField(default=list)  # Counts per customUser.mining.DURATION_BUCKETS bucket
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bucket_start', 'service', 'activity', 'status_code'],
+                                    name='eventlog_rollup_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket_start} {self.service} {self.activity} {self.status_code}: {self.count}"
@@ -0,0 +1,235 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import EventLog
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FIELDS = ('id', 'event_id', 'case_id', 'activity', 'start_time', 'end_time', 'user_id', 'user_name',
+                  'status_code', 'service')
+
+
+def _time_bounds_sql(start=None, end=None):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append('start_time >= %s')
+        params.append(start)
+    if end is not None:
+        clauses.append('start_time < %s')
+        params.append(end)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def delete_event_logs(start=None, end=None, chunk_size=None):
+    """
+    Delete events that started in [start, end) with raw SQL, ``chunk_size`` rows per statement.
+    Every chunk commits on its own, so the write lock is only held for one small DELETE at a time
+    and concurrent log inserts can interleave. No rows are loaded and no signals are sent.
+    Returns the number of deleted rows.
+    """
+    chunk_size = chunk_size or getattr(settings, 'EVENT_LOG_DELETE_CHUNK_SIZE', 5000)
+    table = connection.ops.quote_name(EventLog._meta.db_table)
+    where, params = _time_bounds_sql(start, end)
+    sql = (f'DELETE FROM {table} WHERE id IN '
+           f'(SELECT id FROM {table}{where} ORDER BY id LIMIT %s)')
+
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params + [chunk_size])
+                count = cursor.rowcount
+        deleted += count
+        if count < chunk_size:
+            return deleted
+
+
+def clear_event_logs(start=None, end=None):
+    """
+    Fast path behind ClearEventLogView. Clearing the whole table on PostgreSQL is a COUNT
+    plus TRUNCATE; everything else goes through the chunked raw DELETE.
+    Returns the number of removed rows.
+    """
+    if start is None and end is None and connection.vendor == 'postgresql':
+        table = connection.ops.quote_name(EventLog._meta.db_table)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                # 先锁表再计数，保证返回的数量就是被清空的行数
+                cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+                cursor.execute(f'SELECT COUNT(*) FROM {table}')
+                count = cursor.fetchone()[0]
+                cursor.execute(f'TRUNCATE TABLE {table}')
+        return count
+    return delete_event_logs(start, end)
+
+
+def archive_event_logs(start, end, directory):
+    """
+    Write the events that started in [start, end) to a gzip NDJSON file in ``directory``.
+    The file is written under a temporary name, fsynced and then linked to its final name,
+    so a crash never leaves a truncated archive behind. An existing archive is never overwritten:
+    a rerun after a partial delete, or late events for an archived window, go to the next free
+    ``.partN`` file, so rows can appear in more than one part but are never lost.
+    Returns (path, row count); path is None when the window is empty.
+    """
+    events = EventLog.objects.filter(start_time__gte=start, start_time__lt=end).order_by('id')
+    if not events.exists():
+        return None, 0
+
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"event_log-{start:%Y%m%dT%H%M}-{end:%Y%m%dT%H%M}")
+    fd, partial = tempfile.mkstemp(dir=directory, prefix=os.path.basename(base), suffix='.partial')
+    rows = 0
+    chunk_size = getattr(settings, 'EVENT_LOG_EXPORT_CHUNK_SIZE', 2000)
+    try:
+        with os.fdopen(fd, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as archive:
+                for row in events.values(*ARCHIVE_FIELDS).iterator(chunk_size=chunk_size):
+                    archive.write((json.dumps(row, default=str) + '\n').encode('utf-8'))
+                    rows += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        path = _link_unused_name(partial, base)
+    finally:
+        os.unlink(partial)
+    return path, rows
+
+
+def _link_unused_name(source, base):
+    # os.link 在目标已存在时失败，并发的两次运行也不会互相覆盖
+    part = 1
+    while True:
+        path = f"{base}.ndjson.gz" if part == 1 else f"{base}.part{part}.ndjson.gz"
+        try:
+            os.link(source, path)
+            return path
+        except FileExistsError:
+            part += 1
+
+
+def apply_retention(retention_days=None, archive_dir=None, now=None, dry_run=False):
+    """
+    Archive (when ``archive_dir`` is set) and delete every event older than the retention period,
+    one day window at a time, so a failed archive never loses data that was not yet written.
+    Returns a list of {"start", "end", "archived", "deleted", "path"} per processed window.
+    """
+    retention_days = retention_days if retention_days is not None else settings.EVENT_LOG_RETENTION_DAYS
+    archive_dir = archive_dir if archive_dir is not None else getattr(settings, 'EVENT_LOG_ARCHIVE_DIR', '')
+    now = now or timezone.now()
+    cutoff = (now - timedelta(days=retention_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    windows = []
+    if getattr(settings, 'EVENT_LOG_MONTHLY_PARTITIONS', False):
+        for name, month_start, month_end in expired_partitions(cutoff):
+            window = {'start': month_start, 'end': month_end, 'archived': 0, 'path': None,
+                      'deleted': EventLog.objects.filter(start_time__gte=month_start, start_time__lt=month_end).count()}
+            if not dry_run:
+                if archive_dir:
+                    window['path'], window['archived'] = archive_event_logs(month_start, month_end, archive_dir)
+                drop_partition(name)
+            windows.append(window)
+
+    oldest = EventLog.objects.filter(start_time__lt=cutoff).order_by('start_time').values_list(
+        'start_time', flat=True).first()
+    if oldest is None:
+        return windows
+
+    start = oldest.replace(hour=0, minute=0, second=0, microsecond=0)
+    while start < cutoff:
+        end = min(start + timedelta(days=1), cutoff)
+        window = {'start': start, 'end': end, 'archived': 0, 'deleted': 0, 'path': None}
+        if dry_run:
+            window['deleted'] = EventLog.objects.filter(start_time__gte=start, start_time__lt=end).count()
+        else:
+            if archive_dir:
+                window['path'], window['archived'] = archive_event_logs(start, end, archive_dir)
+            window['deleted'] = delete_event_logs(start, end)
+        if window['deleted']:
+            windows.append(window)
+            logger.info(f"Event log retention: {window['deleted']} events from {start:%Y-%m-%d} removed")
+        start = end
+    return windows
+
+
+# 按月分表（仅 PostgreSQL）：
+# customUser_eventlog 需要预先由 DBA 改建为按 start_time 范围分区的分区表（主键包含 start_time），
+# 之后由 ensure_month_partitions 提前创建分区，apply_retention 对过期的整月分区先归档再直接删除分区表。
+
+def _partition_name(month_start):
+    return f"{EventLog._meta.db_table}_y{month_start:%Y}m{month_start:%m}"
+
+
+def _next_month(month_start):
+    return (month_start + timedelta(days=32)).replace(day=1)
+
+
+def _is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass',
+                       [connection.ops.quote_name(EventLog._meta.db_table)])
+        return cursor.fetchone() is not None
+
+
+def ensure_month_partitions(months_ahead=2, now=None):
+    """
+    Create the monthly partitions for the current month and the next ``months_ahead`` months.
+    """
+    if not _is_partitioned():
+        return []
+    month_start = (now or timezone.now()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    created = []
+    with connection.cursor() as cursor:
+        for _ in range(months_ahead + 1):
+            month_end = _next_month(month_start)
+            name = _partition_name(month_start)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} PARTITION OF '
+                f'{connection.ops.quote_name(EventLog._meta.db_table)} FOR VALUES FROM (%s) TO (%s)',
+                [month_start, month_end])
+            created.append(name)
+            month_start = month_end
+    return created
+
+
+def expired_partitions(cutoff):
+    """
+    Monthly partitions that end on or before ``cutoff``, as (name, month_start, month_end).
+    """
+    if not _is_partitioned():
+        return []
+    prefix = f"{EventLog._meta.db_table}_y"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON pg_inherits.inhparent = parent.oid '
+            'JOIN pg_class child ON pg_inherits.inhrelid = child.oid '
+            'WHERE parent.relname = %s', [EventLog._meta.db_table])
+        names = sorted(name for (name,) in cursor.fetchall() if name.startswith(prefix))
+
+    expired = []
+    for name in names:
+        try:
+            year, month = int(name[len(prefix):len(prefix) + 4]), int(name[-2:])
+        except ValueError:
+            continue
+        month_start = cutoff.replace(year=year, month=month, day=1, hour=0, minute=0, second=0, microsecond=0)
+        month_end = _next_month(month_start)
+        if month_end <= cutoff:
+            expired.append((name, month_start, month_end))
+    return expired
+
+
+def drop_partition(name):
+    # 删除整张分区表是 O(1) 操作，不需要逐行 DELETE
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {connection.ops.quote_name(name)}')
@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db import connection, transaction
+
+from .mining import DURATION_BUCKETS, bucket_index, histogram_quantile
+from .models import EventLogRollup
+
+HISTOGRAM_SIZE = len(DURATION_BUCKETS) + 1
+ROLLUP_DIMENSIONS = ('service', 'activity', 'status_code')
+
+
+def rollup_key(event):
+    bucket_start = event.start_time.replace(second=0, microsecond=0)
+    return bucket_start, event.service or '', event.activity, event.status_code or 0
+
+
+def _empty_stats():
+    return {'count': 0, 'latency_count': 0, 'latency_sum': 0.0, 'latency_min': None, 'latency_max': None,
+            'latency_histogram': [0] * HISTOGRAM_SIZE}
+
+
+def _merge(target, source):
+    target['count'] += source['count']
+    target['latency_count'] += source['latency_count']
+    target['latency_sum'] += source['latency_sum']
+    for field, pick in (('latency_min', min), ('latency_max', max)):
+        if source[field] is not None:
+            target[field] = source[field] if target[field] is None else pick(target[field], source[field])
+    histogram = target['latency_histogram'] or [0] * HISTOGRAM_SIZE
+    source_histogram = source['latency_histogram'] or [0] * HISTOGRAM_SIZE
+    target['latency_histogram'] = [a + b for a, b in zip(histogram, source_histogram)]
+
+
+def aggregate_events(events):
+    """
+    Fold events into {(bucket_start, service, activity, status_code): stats} in memory.
+    """
+    rollups = {}
+    for event in events:
+        stats = rollups.setdefault(rollup_key(event), _empty_stats())
+        stats['count'] += 1
+        if event.end_time is not None:
+            latency = max((event.end_time - event.start_time).total_seconds(), 0.0)
+            stats['latency_count'] += 1
+            stats['latency_sum'] += latency
+            stats['latency_min'] = latency if stats['latency_min'] is None else min(stats['latency_min'], latency)
+            stats['latency_max'] = latency if stats['latency_max'] is None else max(stats['latency_max'], latency)
+            stats['latency_histogram'][int(bucket_index(latency))] += 1
+    return rollups
+
+
+def lock_for_write():
+    """
+    Take the SQLite write lock at the start of the current transaction, as BEGIN IMMEDIATE would.
+    A deferred transaction that reads first (existing event_ids, rollup rows) and writes later fails
+    at once with "database is locked" when another writer is active, without waiting for the busy
+    timeout. PostgreSQL locks rows as they are written, so nothing is needed there.
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {connection.ops.quote_name(EventLogRollup._meta.db_table)} '
+                           f'SET bucket_start = bucket_start WHERE 0')
+
+
+def record_rollups(events):
+    """
+    Add freshly ingested events to the per-minute rollups.
+    The batch is aggregated first, so each touched rollup row is locked and written once.
+    """
+    rollups = aggregate_events(events)
+    if not rollups:
+        return
+    with transaction.atomic():
+        lock_for_write()
+        # 固定加锁顺序，避免并发写入时死锁
+        for (bucket_start, service, activity, status_code), stats in sorted(rollups.items()):
+            rollup, _ = EventLogRollup.objects.select_for_update().get_or_create(
+                bucket_start=bucket_start, service=service, activity=activity, status_code=status_code)
+            current = {field: getattr(rollup, field) for field in stats}
+            _merge(current, stats)
+            for field, value in current.items():
+                setattr(rollup, field, value)
+            rollup.save()
+
+
+def query_rollups(queryset, interval_minutes=1):
+    """
+    Read rollup rows and merge them into ``interval_minutes`` wide buckets.
+    The cost depends only on the number of rollup rows in the window, not on the number of events.
+    """
+    interval = timedelta(minutes=interval_minutes)
+    merged = OrderedDict()
+    rows = queryset.order_by('bucket_start', 'service', 'activity', 'status_code').values(
+        'bucket_start', *ROLLUP_DIMENSIONS, *_empty_stats())
+    for row in rows.iterator():
+        bucket_start = row['bucket_start']
+        if interval_minutes > 1:
+            offset = (bucket_start - bucket_start.replace(hour=0, minute=0)) // interval
+            bucket_start = bucket_start.replace(hour=0, minute=0) + offset * interval
+        key = (bucket_start,) + tuple(row[field] for field in ROLLUP_DIMENSIONS)
+        _merge(merged.setdefault(key, _empty_stats()), row)
+
+    results = []
+    for (bucket_start, service, activity, status_code), stats in merged.items():
+        histogram = stats['latency_histogram']
+        results.append({
+            'bucket_start': bucket_start,
+            'service': service,
+            'activity': activity,
+            'status_code': status_code or None,
+            'count': stats['count'],
+            'latency_mean_seconds': stats['latency_sum'] / stats['latency_count'] if stats['latency_count'] else None,
+            'latency_min_seconds': stats['latency_min'],
+            'latency_max_seconds': stats['latency_max'],
+            'latency_p95_seconds': histogram_quantile(histogram, 0.95, stats['latency_max']),
+        })
+    return results
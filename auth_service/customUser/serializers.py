@@ -68,7 +68,8 @@ class AuthTokenSerializer(serializers.Serializer):
 class EventLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = EventLog
-        fields = ['id', 'case_id', 'activity', 'start_time', 'end_time', 'user_id', 'user_id', 'user_name']
+        fields = ['id', 'event_id', 'case_id', 'activity', 'start_time', 'end_time', 'user_id', 'user_name',
+                  'status_code', 'service']
 
 # 添加自定义的 TokenObtainPairSerializer
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -78,6 +79,9 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
         # 可以在这里添加自定义声明
         token['name'] = user.name
         token['email'] = user.email
+        # 下游服务在 claims 模式下直接用这些声明构建用户，无需再请求 /me/
+        token['is_staff'] = user.is_staff
+        token['is_active'] = user.is_active
         return token
 
     def validate(self, attrs):
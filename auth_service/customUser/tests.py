@@ -1,3 +1,479 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import unittest
+import os
+import tempfile
+import threading
+import uuid
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+from xml.etree import ElementTree
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from . import exports
+from .ingest import bulk_ingest_events
+from .retention import apply_retention, delete_event_logs
+from .models import EventLog, EventLogRollup
+from .serializers import CustomTokenObtainPairSerializer
+
+
+class EventLogViewSetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('eventlog-list')
+
+    def build_event(self, **overrides):
+        event = {
+            "event_id": str(uuid.uuid4()),
+            "case_id": "user_1",
+            "activity": "Accommodation List",
+            "start_time": "2024-10-17T08:00:00Z",
+            "end_time": "2024-10-17T08:00:01Z",
+            "user_id": 1,
+            "user_name": "test@example.com",
+            "status_code": 200,
+        }
+        event.update(overrides)
+        return event
+
+    def test_single_write_stores_complete_record(self):
+        response = self.client.post(self.url, self.build_event(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        event = EventLog.objects.get()
+        self.assertEqual(event.status_code, 200)
+        self.assertIsNotNone(event.end_time)
+
+    def test_retry_with_same_event_id_is_idempotent(self):
+        data = self.build_event()
+        first = self.client.post(self.url, data, format='json')
+        retry = self.client.post(self.url, data, format='json')
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(EventLog.objects.count(), 1)
+
+    def test_malformed_event_id_is_rejected(self):
+        response = self.client.post(self.url, self.build_event(event_id="not-a-uuid"), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('event_id', response.data['msg'])
+        self.assertEqual(EventLog.objects.count(), 0)
+
+    def test_bulk_ingest_json_array(self):
+        url = reverse('eventlog-bulk')
+        events = [self.build_event(), self.build_event(activity="Room Booking Create"),
+                  self.build_event(start_time="not a date")]
+        response = self.client.post(url, json.dumps(events), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['accepted'], 2)
+        self.assertEqual(response.data['errors'][0]['index'], 2)
+        self.assertIn('start_time', response.data['errors'][0]['errors'])
+        self.assertEqual(EventLog.objects.count(), 2)
+
+    def test_bulk_ingest_reports_out_of_range_integers(self):
+        url = reverse('eventlog-bulk')
+        events = [self.build_event(), self.build_event(user_id=2 ** 63), self.build_event(status_code=-2 ** 64)]
+        response = self.client.post(url, json.dumps(events), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['accepted'], 1)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertIn('user_id', response.data['errors'][0]['errors'])
+        self.assertIn('status_code', response.data['errors'][1]['errors'])
+        self.assertEqual(EventLog.objects.count(), 1)
+
+    def test_bulk_ingest_ndjson_skips_already_stored_events(self):
+        url = reverse('eventlog-bulk')
+        events = [self.build_event() for _ in range(3)]
+        body = '\n'.join(json.dumps(event) for event in events)
+        self.client.post(url, body, content_type='application/x-ndjson')
+        response = self.client.post(url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(EventLog.objects.count(), 3)
+
+
+class EventLogCursorPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('eventlog-list')
+        # 两条事件时间相同，验证按 id 区分
+        for minute in (0, 1, 1, 2, 3):
+            EventLog.objects.create(case_id='user_1', activity='Accommodation List',
+                                    start_time=f'2024-10-07T08:{minute:02d}:00Z')
+
+    def test_cursor_pages_cover_all_rows_once(self):
+        seen = []
+        response = self.client.get(self.url, {'cursor': '', 'page_size': 2})
+        self.assertNotIn('count', response.data)
+        while True:
+            seen.extend(row['id'] for row in response.data['results'])
+            if response.data['next'] is None:
+                break
+            response = self.client.get(response.data['next'])
+        expected = list(EventLog.objects.order_by('-start_time', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_count_is_optional(self):
+        response = self.client.get(self.url, {'cursor': '', 'count': 'true'})
+        self.assertEqual(response.data['count'], 5)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class EventLogExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        admin = get_user_model().objects.create_superuser(email='admin@example.com', password='testpass')
+        self.client.force_authenticate(admin)
+
+    def test_csv_export_is_streamed_with_original_columns(self):
+        EventLog.objects.create(case_id='user_1', activity='Accommodation List',
+                                start_time='2024-10-07T08:05:00Z', end_time='2024-10-07T08:06:00Z',
+                                user_id=1, user_name='test@example.com')
+        EventLog.objects.create(case_id='anon_1', activity='Accommodation List', start_time='2024-10-07T09:00:00Z')
+
+        response = self.client.get(reverse('download-csv'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, [
+            'Case_id,Activity,Start Date,End Date,User_id,User_name',
+            'user_1,Accommodation List,7.10.24 08:05,7.10.24 08:06,1,test@example.com',
+            'anon_1,Accommodation List,7.10.24 09:00,,,',
+        ])
+
+    def test_csv_export_applies_time_window_and_filters(self):
+        for hour, activity in ((7, 'Accommodation List'), (8, 'Accommodation List'), (8, 'Room Booking Create')):
+            EventLog.objects.create(case_id='user_1', activity=activity, start_time=f'2024-10-07T{hour:02d}:30:00Z')
+
+        response = self.client.get(reverse('download-csv'), {
+            'start_time': '2024-10-07T08:00:00Z', 'end_time': '2024-10-07T09:00:00Z', 'activity': 'Accommodation List'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[1:], ['user_1,Accommodation List,7.10.24 08:30,,,'])
+
+    def test_list_filters_by_case_and_status_code(self):
+        EventLog.objects.create(case_id='user_1', activity='Accommodation List', start_time='2024-10-07T08:00:00Z',
+                                status_code=200)
+        EventLog.objects.create(case_id='user_1', activity='Accommodation List', start_time='2024-10-07T08:01:00Z',
+                                status_code=404)
+        EventLog.objects.create(case_id='user_2', activity='Accommodation List', start_time='2024-10-07T08:02:00Z',
+                                status_code=200)
+
+        response = self.client.get(reverse('eventlog-list'), {'case_id': 'user_1', 'status_code': '200'})
+        self.assertEqual(response.data['count'], 1)
+        response = self.client.get(reverse('eventlog-list'), {'start_time': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_csv_export_without_events_returns_404(self):
+        response = self.client.get(reverse('download-csv'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ColumnarExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        admin = get_user_model().objects.create_superuser(email='admin@example.com', password='testpass')
+        self.client.force_authenticate(admin)
+        EventLog.objects.create(case_id='user_1', activity='Accommodation List', start_time='2024-10-07T08:00:00Z',
+                                end_time='2024-10-07T08:00:01Z', user_id=1, user_name='a@example.com', status_code=200)
+        EventLog.objects.create(case_id='user_1', activity='Room Booking Create', start_time='2024-10-07T08:01:00Z')
+        EventLog.objects.create(case_id='anon_1', activity='Accommodation List', start_time='2024-10-07T08:02:00Z')
+
+    def test_npz_export_is_dictionary_encoded(self):
+        response = self.client.get(reverse('download-columnar'), {'file_format': 'npz'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = np.load(io.BytesIO(b''.join(response.streaming_content)))
+
+        activities = data['activity_values'][data['activity_codes']]
+        self.assertEqual(list(activities), ['Accommodation List', 'Room Booking Create', 'Accommodation List'])
+        self.assertEqual(list(data['case_id_codes']), [0, 0, 1])
+        self.assertEqual(data['start_time'].dtype, np.int64)
+        self.assertEqual(data['start_time'][0], 1728288000 * 1000000)
+        self.assertEqual(data['end_time'][1], exports.NULL_INT64)
+        self.assertEqual(data['user_name_codes'][1], -1)
+
+    @unittest.skipIf(exports.pq is None, 'pyarrow is not installed')
+    def test_parquet_command_writes_row_groups(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'events.parquet')
+            call_command('export_event_log', path, '--format', 'parquet', '--chunk-size', '2', stdout=io.StringIO())
+            parquet = exports.pq.ParquetFile(path)
+            self.assertEqual(parquet.metadata.num_row_groups, 2)
+            table = parquet.read()
+        self.assertEqual(table.column('activity').type, exports.pa.dictionary(exports.pa.int32(), exports.pa.string()))
+        self.assertEqual(table.column('case_id').to_pylist(), ['user_1', 'user_1', 'anon_1'])
+
+
+class XESExportTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        admin = get_user_model().objects.create_superuser(email='admin@example.com', password='testpass')
+        self.client.force_authenticate(admin)
+        EventLog.objects.create(case_id='user_1', activity='Room Booking Create', start_time='2024-10-07T08:05:00Z',
+                                user_name='a@example.com', status_code=201)
+        EventLog.objects.create(case_id='anon_1', activity='Accommodation List', start_time='2024-10-07T08:00:00Z')
+        EventLog.objects.create(case_id='user_1', activity='Accommodation List', start_time='2024-10-07T08:00:00Z',
+                                end_time='2024-10-07T08:00:01Z', user_name='a@example.com', status_code=200)
+
+    def parse_traces(self, body):
+        log = ElementTree.fromstring(body)
+        traces = {}
+        for trace in log.findall('trace'):
+            name = trace.find("string[@key='concept:name']").get('value')
+            traces[name] = [event.find("string[@key='concept:name']").get('value') for event in trace.findall('event')]
+        return traces
+
+    def test_events_are_grouped_into_ordered_traces(self):
+        response = self.client.get(reverse('download-xes'))
+        self.assertTrue(response.streaming)
+        traces = self.parse_traces(b''.join(response.streaming_content))
+        self.assertEqual(traces, {
+            'anon_1': ['Accommodation List'],
+            'user_1': ['Accommodation List', 'Room Booking Create'],
+        })
+
+    def test_gzip_output(self):
+        response = self.client.get(reverse('download-xes'), {'compress': 'gzip', 'case_id': 'anon_1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        traces = self.parse_traces(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(list(traces), ['anon_1'])
+
+    @patch.object(exports, 'XES_FLUSH_BYTES', 1)
+    def test_long_trace_is_flushed_between_events(self):
+        pieces = list(exports.iter_xes(EventLog.objects.filter(case_id='user_1')))
+        self.assertTrue(all(piece.count(b'<event>') <= 1 for piece in pieces))
+        self.assertEqual(self.parse_traces(b''.join(pieces)), {
+            'user_1': ['Accommodation List', 'Room Booking Create'],
+        })
+
+
+@override_settings(EVENT_LOG_EXPORT_CHUNK_SIZE=2)
+class ProcessMiningViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        admin = get_user_model().objects.create_superuser(email='admin@example.com', password='testpass')
+        self.client.force_authenticate(admin)
+        # 两个 case 走相同路径，一个 case 只有列表；chunk 大小为 2，跨块的转移也要统计
+        for case_id in ('user_1', 'user_2'):
+            EventLog.objects.create(case_id=case_id, activity='Accommodation List', start_time='2024-10-07T08:00:00Z',
+                                    end_time='2024-10-07T08:00:02Z')
+            EventLog.objects.create(case_id=case_id, activity='Room Booking Create',
+                                    start_time='2024-10-07T08:01:00Z', end_time='2024-10-07T08:01:00.200Z')
+        EventLog.objects.create(case_id='anon_1', activity='Accommodation List', start_time='2024-10-07T09:00:00Z')
+
+    def test_dfg_durations_and_variants(self):
+        response = self.client.get(reverse('process-mining'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual((data['events'], data['cases']), (5, 3))
+
+        self.assertEqual(len(data['dfg']), 1)
+        edge = data['dfg'][0]
+        self.assertEqual((edge['source'], edge['target'], edge['count']),
+                         ('Accommodation List', 'Room Booking Create', 2))
+        self.assertEqual(edge['mean_transition_seconds'], 60)
+
+        durations = {row['activity']: row for row in data['activities']}
+        self.assertEqual(durations['Accommodation List']['count'], 2)
+        self.assertEqual(durations['Room Booking Create']['p95_duration_seconds'], 0.2)
+
+        self.assertEqual(data['variants'][0], {'activities': ['Accommodation List', 'Room Booking Create'], 'count': 2})
+        self.assertEqual(data['variant_count'], 2)
+
+    def test_results_are_cached_per_window(self):
+        self.client.get(reverse('process-mining'), {'start_time': '2024-10-07'})
+        EventLog.objects.create(case_id='user_3', activity='Accommodation List', start_time='2024-10-07T10:00:00Z')
+        cached = self.client.get(reverse('process-mining'), {'start_time': '2024-10-07'})
+        other_window = self.client.get(reverse('process-mining'), {'start_time': '2024-10-07T09:30:00Z'})
+        self.assertEqual(cached.data['events'], 5)
+        self.assertEqual(other_window.data['events'], 1)
+
+
+class EventLogRollupTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        admin = get_user_model().objects.create_superuser(email='admin@example.com', password='testpass')
+        self.client.force_authenticate(admin)
+
+    def build_event(self, second, latency_ms, status_code=200, minute=0):
+        start = f'2024-10-07T08:{minute:02d}:{second:02d}'
+        return {
+            "event_id": str(uuid.uuid4()), "case_id": "user_1", "activity": "Accommodation List",
+            "service": "accommodation", "status_code": status_code,
+            "start_time": f'{start}Z', "end_time": f'{start}.{latency_ms:03d}Z',
+        }
+
+    def test_bulk_ingest_updates_minute_rollups_once(self):
+        events = [self.build_event(second, latency) for second, latency in ((1, 100), (2, 300), (3, 200))]
+        events.append(self.build_event(4, 10, status_code=500))
+        body = json.dumps(events)
+        self.client.post(reverse('eventlog-bulk'), body, content_type='application/json')
+        # 重试同一批不应重复计数
+        self.client.post(reverse('eventlog-bulk'), body, content_type='application/json')
+
+        rollup = EventLogRollup.objects.get(status_code=200)
+        self.assertEqual(rollup.count, 3)
+        self.assertEqual((rollup.latency_min, rollup.latency_max), (0.1, 0.3))
+        self.assertAlmostEqual(rollup.latency_sum, 0.6)
+        self.assertEqual(EventLogRollup.objects.count(), 2)
+
+    def test_single_write_and_query_api(self):
+        self.client.post(reverse('eventlog-list'), self.build_event(1, 100), format='json')
+        self.client.post(reverse('eventlog-list'), self.build_event(1, 400, minute=3), format='json')
+
+        response = self.client.get(reverse('event-log-rollups'), {'service': 'accommodation'})
+        self.assertEqual([row['count'] for row in response.data], [1, 1])
+
+        response = self.client.get(reverse('event-log-rollups'), {'interval': 5})
+        self.assertEqual(len(response.data), 1)
+        row = response.data[0]
+        self.assertEqual(row['count'], 2)
+        self.assertAlmostEqual(row['latency_mean_seconds'], 0.25)
+        self.assertEqual(row['latency_p95_seconds'], 0.4)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite write lock behaviour')
+class ConcurrentBulkIngestTest(TransactionTestCase):
+    def run_in_threads(self, target, count):
+        threads = [threading.Thread(target=target, args=(number,)) for number in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_concurrent_batches_on_file_database(self):
+        # 内存测试库使用共享缓存，锁行为与生产不同；新线程的连接改用临时文件库
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = connection.settings_dict
+        self.addCleanup(settings_dict.__setitem__, 'NAME', settings_dict['NAME'])
+        settings_dict['NAME'] = os.path.join(directory.name, 'ingest.sqlite3')
+
+        def migrate(_):
+            call_command('migrate', 'customUser', verbosity=0)
+            connections.close_all()
+
+        self.run_in_threads(migrate, 1)
+        failures, totals = [], {}
+
+        def ingest(worker):
+            try:
+                for batch in range(10):
+                    bulk_ingest_events([{
+                        "event_id": str(uuid.uuid4()), "case_id": f"case_{worker}", "activity": "Accommodation List",
+                        "service": "accommodation", "status_code": 200,
+                        "start_time": f"2024-10-07T08:{batch:02d}:{index % 60:02d}Z",
+                    } for index in range(50)])
+            except OperationalError as e:
+                failures.append(e)
+            finally:
+                connections.close_all()
+
+        def count(_):
+            totals['events'] = EventLog.objects.count()
+            totals['rolled_up'] = sum(EventLogRollup.objects.values_list('count', flat=True))
+            connections.close_all()
+
+        self.run_in_threads(ingest, 6)
+        self.run_in_threads(count, 1)
+        self.assertEqual(failures, [])
+        self.assertEqual(totals, {'events': 6 * 10 * 50, 'rolled_up': 6 * 10 * 50})
+
+
+class RetentionTest(TestCase):
+    def setUp(self):
+        for day in (1, 1, 2, 20):
+            EventLog.objects.create(case_id='user_1', activity='Accommodation List',
+                                    start_time=f'2024-10-{day:02d}T08:00:00Z')
+
+    def test_chunked_delete_respects_bounds(self):
+        deleted = delete_event_logs(start=parse_datetime('2024-10-01T00:00:00Z'),
+                                    end=parse_datetime('2024-10-03T00:00:00Z'), chunk_size=2)
+        self.assertEqual(deleted, 3)
+        self.assertEqual(EventLog.objects.count(), 1)
+
+    def test_expired_days_are_archived_before_delete(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            windows = apply_retention(retention_days=10, archive_dir=tmp, now=parse_datetime('2024-10-21T12:00:00Z'))
+            self.assertEqual([window['deleted'] for window in windows], [2, 1])
+            with gzip.open(windows[0]['path'], 'rt') as archive:
+                rows = [json.loads(line) for line in archive]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['activity'], 'Accommodation List')
+        self.assertEqual(list(EventLog.objects.values_list('start_time__day', flat=True)), [20])
+
+    def test_rerun_after_failed_delete_keeps_every_archived_event(self):
+        for minute in range(10):
+            EventLog.objects.create(case_id='user_2', activity='Restaurant List',
+                                    start_time=f'2024-10-05T09:{minute:02d}:00Z')
+        expired_ids = set(EventLog.objects.filter(start_time__lt='2024-10-11T00:00:00Z').values_list('id', flat=True))
+        now = parse_datetime('2024-10-21T12:00:00Z')
+
+        def fail_after_first_chunk(start, end):
+            if start.day != 5:
+                return delete_event_logs(start, end)
+            # 第一块（4 条）已提交后失败
+            first_chunk = EventLog.objects.filter(start_time__gte=start, start_time__lt=end).order_by('id')[:4]
+            EventLog.objects.filter(id__in=list(first_chunk.values_list('id', flat=True))).delete()
+            raise RuntimeError('connection lost')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with patch('customUser.retention.delete_event_logs', side_effect=fail_after_first_chunk):
+                with self.assertRaises(RuntimeError):
+                    apply_retention(retention_days=10, archive_dir=tmp, now=now)
+            windows = apply_retention(retention_days=10, archive_dir=tmp, now=now)
+
+            archived = set()
+            names = sorted(os.listdir(tmp))
+            for name in names:
+                with gzip.open(os.path.join(tmp, name), 'rt') as archive:
+                    archived.update(json.loads(line)['id'] for line in archive)
+
+        self.assertEqual([window['deleted'] for window in windows], [6])
+        self.assertIn('event_log-20241005T0000-20241006T0000.part2.ndjson.gz', names)
+        self.assertFalse(any(name.endswith('.partial') for name in names))
+        self.assertFalse(EventLog.objects.filter(start_time__lt='2024-10-11T00:00:00Z').exists())
+        # 第一次运行已删除的 4 条仍在第一份归档中
+        self.assertEqual(len([name for name in names if name.startswith('event_log-20241005')]), 2)
+        self.assertEqual(archived, expired_ids)
+
+    def test_clear_view_with_date_bounds(self):
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_superuser(email='admin@example.com',
+                                                                            password='testpass'))
+        url = reverse('clear-event-logs')
+        response = client.delete(f'{url}?start_time=2024-10-02&end_time=2024-10-21')
+        self.assertEqual(response.data['message'], 'Successfully deleted 2 event logs.')
+        response = client.delete(url)
+        self.assertEqual(response.data['message'], 'Successfully deleted 2 event logs.')
+        self.assertFalse(EventLog.objects.exists())
+
+    def test_dry_run_keeps_events(self):
+        windows = apply_retention(retention_days=10, archive_dir='', now=parse_datetime('2024-10-21T12:00:00Z'),
+                                  dry_run=True)
+        self.assertEqual(sum(window['deleted'] for window in windows), 3)
+        self.assertEqual(EventLog.objects.count(), 4)
+
+
+class CustomTokenObtainPairSerializerTest(TestCase):
+    def test_token_carries_user_claims(self):
+        user = get_user_model().objects.create_user(email='staff@example.com', password='testpass', name='Staff',
+                                                    is_staff=True)
+        token = CustomTokenObtainPairSerializer.get_token(user)
+        access = token.access_token
+
+        self.assertEqual(access['email'], 'staff@example.com')
+        self.assertEqual(access['name'], 'Staff')
+        self.assertTrue(access['is_staff'])
+        self.assertTrue(access['is_active'])
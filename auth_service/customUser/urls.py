@@ -7,6 +7,10 @@ from .views import (
     ManageUserView,
     EventLogViewSet,
     GenerateAndDownloadCSV,
+    GenerateAndDownloadColumnar,
+    GenerateAndDownloadXES,
+    ProcessMiningView,
+    EventLogRollupView,
     ClearEventLogView,
 )
 
@@ -19,6 +23,10 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('me/', ManageUserView.as_view(), name='me'),
     path('event-logs/download-csv/', GenerateAndDownloadCSV.as_view(), name='download-csv'),
+    path('event-logs/download-columnar/', GenerateAndDownloadColumnar.as_view(), name='download-columnar'),
+    path('event-logs/download-xes/', GenerateAndDownloadXES.as_view(), name='download-xes'),
+    path('event-logs/process-mining/', ProcessMiningView.as_view(), name='process-mining'),
+    path('event-logs/rollups/', EventLogRollupView.as_view(), name='event-log-rollups'),
     path('event-logs/clear/', ClearEventLogView.as_view(), name='clear-event-logs'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
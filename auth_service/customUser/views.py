@@ -1,19 +1,25 @@
+import binascii
 import logging
-from io import BytesIO
+import tempfile
+import uuid
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
 
-import pandas as pd
-from django.http import JsonResponse, HttpResponse
+from django.db.models import Q
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from drf_spectacular.utils import extend_schema
-# 导入 PM4PY 相关库
-# from pm4py.objects.conversion.log import converter as log_converter
-# from pm4py.objects.log.exporter.xes import exporter as xes_exporter
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
 from rest_framework import generics, authentication, permissions, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -23,7 +29,13 @@ from customUser.serializers import (
     UserSerializer,
     AuthTokenSerializer, EventLogSerializer, CustomTokenObtainPairSerializer
 )
-from .models import EventLog
+from .exports import COLUMNAR_CONTENT_TYPES, columnar_formats, gzip_stream, iter_csv, iter_xes, write_columnar
+from .filters import FILTER_PARAMS, filter_event_logs, filter_rollups, parse_time_param
+from .mining import cached_process_mining
+from .retention import clear_event_logs
+from .rollups import query_rollups, record_rollups
+from .ingest import EventPayloadError, bulk_ingest_events, parse_event_payload
+from .models import EventLog, EventLogRollup
 
 
 # A generic view class for handling POST requests, allowing the creation of new objects
@@ -86,130 +98,275 @@ class EventLogPagination(PageNumberPagination):
     max_page_size = 100  # 限制每页最多 100 条记录
 
 
+class EventLogCursorPagination(BasePagination):
+    """
+    Keyset pagination over (start_time, id), newest first.
+
+    The cursor encodes the (start_time, id) of the last row of the previous page, and the
+    next page is read with ``WHERE (start_time, id) < cursor`` through the (start_time, id)
+    index, so page N costs the same as page 1. The total count is only computed when the
+    client asks for it with ``count=true``.
+    """
+    cursor_query_param = 'cursor'
+    page_size = EventLogPagination.page_size
+    page_size_query_param = EventLogPagination.page_size_query_param
+    max_page_size = EventLogPagination.max_page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if request.query_params.get('count') in ('true', '1') else None
+
+        queryset = queryset.order_by('-start_time', '-id')
+        position = self.decode_cursor(request)
+        if position is not None:
+            start_time, pk = position
+            queryset = queryset.filter(Q(start_time__lt=start_time) | Q(start_time=start_time, id__lt=pk))
+
+        # 多取一条用来判断是否还有下一页
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[:self.page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            start_time, pk = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').rsplit('|', 1)
+            start_time = parse_datetime(start_time)
+            pk = int(pk)
+        except (ValueError, UnicodeError, binascii.Error):
+            raise NotFound('Invalid cursor')
+        if start_time is None:
+            raise NotFound('Invalid cursor')
+        return start_time, pk
+
+    def encode_cursor(self, instance):
+        position = f"{instance.start_time.isoformat()}|{instance.pk}"
+        return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data):
+        payload = OrderedDict([('next', self.get_next_link())])
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+
 class EventLogViewSet(viewsets.ModelViewSet):
     queryset = EventLog.objects.all().order_by('-start_time')
     serializer_class = EventLogSerializer
     permission_classes = [AllowAny]
     pagination_class = EventLogPagination
 
+    @property
+    def paginator(self):
+        # 请求带 cursor 参数（首页可为空值）时使用游标分页，否则保持原来的页码分页
+        if not hasattr(self, '_paginator'):
+            if EventLogCursorPagination.cursor_query_param in self.request.query_params:
+                self._paginator = EventLogCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            queryset = filter_event_logs(queryset, self.request.query_params)
+        return queryset
+
+    def create(self, request, *args, **kwargs):
+        # Services send a client-generated event_id, so a retried write returns the existing row
+        event_id = request.data.get('event_id') if isinstance(request.data, dict) else None
+        try:
+            event_id = uuid.UUID(str(event_id)) if event_id else None
+        except ValueError:
+            # 格式不对的 event_id 交给序列化器校验，返回 400
+            event_id = None
+        if event_id:
+            existing = EventLog.objects.filter(event_id=event_id).first()
+            if existing is not None:
+                serializer = self.get_serializer(existing)
+                return Response(serializer.data, status=status.HTTP_200_OK)
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        event = serializer.save()
+        # 两次写入模式下 create 时还没有 end_time，等 update 补全后再计入汇总
+        if event.end_time is not None:
+            record_rollups([event])
+
+    def perform_update(self, serializer):
+        completed_before = serializer.instance.end_time is not None
+        event = serializer.save()
+        if not completed_before and event.end_time is not None:
+            record_rollups([event])
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request, *args, **kwargs):
+        """
+        Ingest many events in one request: a JSON array or NDJSON body.
+        Rows are validated without serializer instances and inserted with bulk_create
+        in a single transaction; invalid rows are reported by index and skipped.
+        """
+        try:
+            rows = parse_event_payload(request.body, request.content_type)
+        except EventPayloadError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        max_events = getattr(settings, 'EVENT_LOG_BULK_MAX_EVENTS', 10000)
+        if len(rows) > max_events:
+            return Response({"detail": f"A bulk request may contain at most {max_events} events."},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        accepted, errors = bulk_ingest_events(rows)
+        return Response({
+            "received": len(rows),
+            "accepted": len(accepted),
+            "errors": errors,
+        }, status=status.HTTP_201_CREATED)
+
 
 @extend_schema(tags=['Event Log'])
 class GenerateAndDownloadCSV(APIView):
     permission_classes = [permissions.IsAdminUser]
 
     def get(self, request, *args, **kwargs):
-        try:
-            # 第一步：从数据库中检索所有用户事件日志数据
-            events = EventLog.objects.all().values('case_id', 'activity', 'start_time', 'end_time', 'user_id',
-                                                   'user_name')
-            df = pd.DataFrame(list(events))
-
-            if df.empty:
-                logging.error("No events found in the database.")
-                return JsonResponse({"message": "No events found."}, status=404)
-
-            # 修改列名为大写或你需要的格式
-            df.columns = ['Case_id', 'Activity', 'Start_time', 'End_time', 'User_id', 'User_name']
+        # 按主键顺序用服务端游标分块读取，边查询边输出，内存占用与表大小无关
+        events = filter_event_logs(EventLog.objects.order_by('id'), request.query_params)
+        if not events.exists():
+            logging.error("No events found in the database.")
+            return JsonResponse({"message": "No events found."}, status=404)
 
-            # 格式化日期列，格式为 "日.月.年 时:分"
-            df['Start_time'] = pd.to_datetime(df['Start_time']).dt.strftime('%-d.%-m.%y %H:%M')
-            df['End_time'] = pd.to_datetime(df['End_time']).dt.strftime('%-d.%-m.%y %H:%M')
+        response = StreamingHttpResponse(iter_csv(events), content_type='application/csv')
+        response['Content-Disposition'] = 'attachment; filename="event_log.csv"'
+        return response
 
-            # 重命名列名为你需要的格式
-            df.rename(columns={
-                'Start_time': 'Start Date',
-                'End_time': 'End Date'
-            }, inplace=True)
 
-            # 第二步：检查数据格式并准备 CSV 数据
-            csv_buffer = BytesIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)  # 重置指针到开始位置
+@extend_schema(tags=['Event Log'])
+class GenerateAndDownloadColumnar(APIView):
+    """
+    Download the event log as Parquet (when pyarrow is installed) or dictionary-encoded NPZ.
+    Takes the same filters as the CSV export, plus ``file_format``.
+    """
+    permission_classes = [permissions.IsAdminUser]
 
-            logging.info("Successfully created CSV file in memory.")
+    def get(self, request, *args, **kwargs):
+        formats = columnar_formats()
+        file_format = request.query_params.get('file_format', formats[0])
+        if file_format not in formats:
+            return Response({"detail": f"file_format must be one of: {', '.join(formats)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
 
-            # 第三步：提供文件给用户下载
-            response = HttpResponse(csv_buffer.getvalue(), content_type='application/csv')
-            response['Content-Disposition'] = 'attachment; filename="event_log.csv"'
-            return response
+        events = filter_event_logs(EventLog.objects.order_by('id'), request.query_params)
+        # 列式文件需要完整写完才能读取，先写入磁盘临时文件，再以文件流的方式返回
+        output = tempfile.TemporaryFile()
+        rows = write_columnar(events, output, file_format)
+        output.seek(0)
+        logging.info(f"Exported {rows} event logs as {file_format}.")
 
-        except Exception as e:
-            # 输出详细的错误日志
-            logging.error(f"An error occurred during CSV generation or download: {e}")
-            return JsonResponse({"message": f"Internal Server Error: {e}"}, status=500)
+        return FileResponse(output, as_attachment=True, filename=f'event_log.{file_format}',
+                            content_type=COLUMNAR_CONTENT_TYPES[file_format])
 
 
 @extend_schema(tags=['Event Log'])
 class ClearEventLogView(APIView):
     """
-    API View to clear all event logs from the database.
+    API View to clear event logs from the database, optionally only those that started
+    in [start_time, end_time). Rows are removed with raw SQL in short chunks (TRUNCATE when
+    clearing everything on PostgreSQL) instead of going through the ORM delete collector.
     Only accessible to admin users.
     """
     permission_classes = [permissions.IsAdminUser]
 
     def delete(self, request, *args, **kwargs):
-        # Clear all EventLog data
-        deleted, _ = EventLog.objects.all().delete()
+        start = request.query_params.get('start_time')
+        end = request.query_params.get('end_time')
+        deleted = clear_event_logs(
+            start=parse_time_param('start_time', start) if start else None,
+            end=parse_time_param('end_time', end) if end else None,
+        )
 
         # Return response
         return Response({"message": f"Successfully deleted {deleted} event logs."}, status=status.HTTP_200_OK)
 
 
-# @extend_schema(tags=['Event Log'])
-# class GenerateAndDownloadXES(APIView):
-#     permission_classes = [permissions.IsAdminUser]
-
-#     def get(self, request, *args, **kwargs):
-#         try:
-#             events = EventLog.objects.all().values(
-#                 'case_id', 'activity', 'start_time', 'end_time', 'user_id', 'user_name', 'status_code'
-#             )
-#             df = pd.DataFrame(list(events))
-
-#             if df.empty:
-#                 logging.error("没有找到事件日志。")
-#                 return JsonResponse({"message": "没有找到事件日志。"}, status=404)
-
-#             # 重命名列以符合 PM4PY 的要求
-#             df.rename(columns={
-#                 'case_id': 'case:concept:name',
-#                 'activity': 'concept:name',
-#                 'start_time': 'time:timestamp',
-#                 'end_time': 'time:endTimestamp',
-#                 'user_name': 'org:resource',
-#                 'status_code': 'status'
-#             }, inplace=True)
+@extend_schema(tags=['Event Log'])
+class GenerateAndDownloadXES(APIView):
+    """
+    Stream the event log as XES, one trace per case_id. Takes the same filters as the
+    CSV export; ``compress=gzip`` returns a gzipped .xes.gz file.
+    """
+    permission_classes = [permissions.IsAdminUser]
 
-#             # 确保时间戳列的格式正确（ISO 8601）
-#             df['time:timestamp'] = pd.to_datetime(df['time:timestamp']).dt.strftime('%Y-%m-%dT%H:%M:%S.%f%z')
-#             df['time:endTimestamp'] = pd.to_datetime(df['time:endTimestamp']).dt.strftime('%Y-%m-%dT%H:%M:%S.%f%z')
+    def get(self, request, *args, **kwargs):
+        events = filter_event_logs(EventLog.objects.all(), request.query_params)
+        if not events.exists():
+            logging.error("没有找到事件日志。")
+            return JsonResponse({"message": "没有找到事件日志。"}, status=404)
 
-#             # 添加生命周期信息
-#             df['lifecycle:transition'] = 'complete'
+        if request.query_params.get('compress') == 'gzip':
+            response = StreamingHttpResponse(gzip_stream(iter_xes(events)), content_type='application/gzip')
+            response['Content-Disposition'] = 'attachment; filename="event_log.xes.gz"'
+        else:
+            response = StreamingHttpResponse(iter_xes(events), content_type='application/xml')
+            response['Content-Disposition'] = 'attachment; filename="event_log.xes"'
+        return response
 
-#             # 按照 case_id 和 timestamp 排序
-#             df = df.sort_values(['case:concept:name', 'time:timestamp'])
 
-#             # 将 DataFrame 转换为 event log 对象
-#             event_log = log_converter.apply(df)
+@extend_schema(tags=['Event Log'])
+class ProcessMiningView(APIView):
+    """
+    Directly-follows graph, activity duration statistics and variant frequencies for the
+    filtered window. Results are cached per window for PROCESS_MINING_CACHE_TTL seconds.
+    """
+    permission_classes = [permissions.IsAdminUser]
 
-#             # 创建一个内存文件对象来存储 XES 文件
-#             xes_buffer = BytesIO()
+    def get(self, request, *args, **kwargs):
+        params = {key: request.query_params.get(key) for key in FILTER_PARAMS if request.query_params.get(key)}
+        events = filter_event_logs(EventLog.objects.all(), params)
+        try:
+            max_variants = min(max(int(request.query_params.get('max_variants', 20)), 1), 1000)
+        except ValueError:
+            return Response({"detail": "max_variants must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(cached_process_mining(events, params, max_variants=max_variants), status=status.HTTP_200_OK)
 
-#             # 将 event log 导出为 XES 格式
-#             xes_exporter.apply(event_log, xes_buffer)
-#             xes_buffer.seek(0)  # 重置指针到开始位置
 
-#             logging.info("成功创建 XES 文件。")
+@extend_schema(tags=['Event Log'])
+class EventLogRollupView(APIView):
+    """
+    Per-minute event metrics from the rollup table: count and latency mean/min/max/p95
+    per activity, service and status code. ``interval`` (minutes) merges buckets.
+    """
+    permission_classes = [permissions.IsAdminUser]
 
-#             # 提供文件给用户下载
-#             response = HttpResponse(xes_buffer.getvalue(), content_type='application/xml')
-#             response['Content-Disposition'] = 'attachment; filename="event_log.xes"'
-#             return response
+    def get(self, request, *args, **kwargs):
+        try:
+            interval = int(request.query_params.get('interval', 1))
+        except ValueError:
+            interval = 0
+        if not 1 <= interval <= 1440:
+            return Response({"detail": "interval must be an integer between 1 and 1440 minutes."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        rollups = filter_rollups(EventLogRollup.objects.all(), request.query_params)
+        return Response(query_rollups(rollups, interval_minutes=interval), status=status.HTTP_200_OK)
 
-#         except Exception as e:
-#             logging.error(f"生成或下载 XES 文件时发生错误: {e}")
-#             return JsonResponse({"message": f"内部服务器错误: {e}"}, status=500)
 
 @extend_schema(tags=["AUTH - Health"])
 class HealthView(APIView):
@@ -1,13 +1,21 @@
+import hashlib
 import logging
-import requests
+import re
+import time
+import uuid
 from django.utils import timezone
 from django.conf import settings
 from rest_framework import viewsets
-from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
 from .auth_backend import JWTAuthBackend  # 导入 JWTAuthBackend
+from .event_shipper import get_shipper
 
 logger = logging.getLogger(__name__)
 
+CASE_ID_COOKIE_SALT = 'request-logging.case-id'
+CLIENT_CASE_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,128}$')
+
 class RequestLoggingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -19,6 +27,8 @@ class RequestLoggingMiddleware:
         return response
 
     def process_view(self, request, view_func, view_args, view_kwargs):
+        if not getattr(settings, 'LOGGING_ENABLED', True):
+            return None
         try:
             # 获取视图类和动作名称
             view_class, action_name = self.get_view_class_and_action(request)
@@ -28,7 +38,7 @@ class RequestLoggingMiddleware:
                 # 获取用户信息（可以是已认证用户或匿名用户）
                 user = self.get_user_from_token(request)
                 case_id = self.get_or_create_case_id(request, user)
-                request.session['case_id'] = case_id
+                request.case_id = case_id
 
                 request.start_time = timezone.now()
                 user_name = getattr(user, 'email', 'Anonymous') if user else 'Anonymous'
@@ -41,22 +51,24 @@ class RequestLoggingMiddleware:
                 # 附加请求操作的后缀（如 List, Retrieve, Create）
                 activity = f"{activity_name} {action_name.capitalize()}" if action_name else activity_name
 
-                # 构建事件日志数据
+                # 构建事件日志数据，event_id 由客户端生成，保证重试时幂等
                 request.event_log = {
+                    "event_id": str(uuid.uuid4()),
                     "case_id": case_id,
                     "activity": activity,
                     "start_time": str(request.start_time),
                     "user_id": user_id,
-                    "user_name": user_name
+                    "user_name": user_name,
+                    "service": getattr(settings, 'EVENT_LOG_SERVICE_NAME', ''),
                 }
 
                 # 打印日志数据以供调试
                 logger.debug(f"Event Log: {request.event_log}")
 
-                # 发送日志到日志 API 并保存返回的 ID
-                log_id = self.log_event_to_api(request.event_log)
-                if log_id:
-                    request.event_log['id'] = log_id  # 保存日志ID，后续更新用
+                # 将日志放入后台队列异步发送，handle 用于后续更新时取回日志ID
+                request.event_log_handle = {}
+                if not getattr(settings, 'EVENT_LOG_SINGLE_WRITE', True):
+                    self.log_event_to_api(request.event_log, request.event_log_handle)
             else:
                 # 不满足条件，不记录日志
                 logger.debug("View is not a ModelViewSet with activity_name. Skipping logging.")
@@ -66,17 +78,29 @@ class RequestLoggingMiddleware:
 
     def process_response(self, request, response):
         try:
-            if hasattr(request, 'event_log') and 'id' in request.event_log:
+            if hasattr(request, 'event_log') and hasattr(request, 'event_log_handle'):
                 end_time = timezone.now()
                 request.event_log['end_time'] = str(end_time)
                 request.event_log['status_code'] = response.status_code
 
-                # 更新日志并发送到日志 API
-                self.update_log_event_to_api(request.event_log)
+                if getattr(settings, 'EVENT_LOG_SINGLE_WRITE', True):
+                    # 单次写入：响应完成后一次性发送完整的日志记录
+                    self.record_event_to_api(request.event_log)
+                else:
+                    # 更新日志并放入后台队列
+                    self.update_log_event_to_api(request.event_log, request.event_log_handle)
                 logger.debug(f"Updated Event Log: {request.event_log}")
             else:
                 # logger.debug("No event_log or log ID found in request. Skipping process_response logging.")
                 pass
+
+            # 匿名用户的 case ID 通过签名 cookie 下发，后续请求沿用同一个 case
+            new_case_id = getattr(request, 'new_case_id', None)
+            if new_case_id:
+                response.set_signed_cookie(
+                    settings.CASE_ID_COOKIE_NAME, new_case_id, salt=CASE_ID_COOKIE_SALT,
+                    max_age=settings.CASE_ID_COOKIE_MAX_AGE, httponly=True, samesite='Lax',
+                )
         except Exception as e:
             logger.error(f"Error in process_response: {str(e)}")
         finally:
@@ -85,6 +109,7 @@ class RequestLoggingMiddleware:
     def get_user_from_token(self, request):
         """
         使用 JWTAuthBackend 从请求中的 JWT Token 获取用户。
+        认证结果会保存在请求上，DRF 认证同一请求时直接复用，不会再次请求 auth_service。
         如果没有 Token 或认证失败，返回 None（表示匿名用户）。
         """
         try:
@@ -144,49 +169,60 @@ class RequestLoggingMiddleware:
 
     def get_or_create_case_id(self, request, user):
         """
-        生成或获取用于日志记录的 case ID
+        生成或获取用于日志记录的 case ID。
+        匿名请求不再创建数据库 session，依次使用：客户端 X-Case-Id 请求头、已有 session、
+        签名 cookie，最后回退到 IP + User-Agent + 时间窗口的哈希（并通过 cookie 下发）。
         """
         if user:
             return f"user_{user.id}"
-        else:
-            session_key = request.session.session_key
-            if not session_key:
-                request.session.create()
-                session_key = request.session.session_key
+
+        client_case_id = request.headers.get('X-Case-Id')
+        if client_case_id and CLIENT_CASE_ID_PATTERN.match(client_case_id):
+            return f"client_{client_case_id}"
+
+        # 只读取已存在的 session key，不会写数据库
+        session_key = request.session.session_key if hasattr(request, 'session') else None
+        if session_key:
             return f"session_{session_key}"
 
-    def log_event_to_api(self, event_data):
+        cookie_case_id = request.get_signed_cookie(
+            settings.CASE_ID_COOKIE_NAME, default=None, salt=CASE_ID_COOKIE_SALT,
+            max_age=settings.CASE_ID_COOKIE_MAX_AGE,
+        )
+        if cookie_case_id:
+            return cookie_case_id
+
+        case_id = self.get_anonymous_case_id(request)
+        request.new_case_id = case_id
+        return case_id
+
+    def get_anonymous_case_id(self, request):
         """
-        发送日志到日志 API，并返回日志的 ID
+        根据客户端 IP、User-Agent 和时间窗口计算匿名 case ID，同一窗口内的请求归为同一个 case
         """
-        try:
-            response = requests.post(f"{settings.LOGS_API_URL}/api/customUser/event-logs/", json=event_data)
-            if response.status_code == 201:
-                response_data = response.json()
-                log_id = response_data.get('data', {}).get('id')  # 获取日志ID
-                if log_id:
-                    logger.info(f"Log successfully recorded to API with ID: {log_id}")
-                return log_id
-            else:
-                logger.error(f"Failed to record log to API: {response.status_code} {response.text}")
-                return None
-        except Exception as e:
-            # logger.error(f"Error sending log to API: {str(e)}")
-            return None
+        ip = request.META.get('HTTP_X_REAL_IP') or request.META.get('REMOTE_ADDR', '')
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        time_bucket = int(time.time() // settings.CASE_ID_TIME_BUCKET)
+        digest = hashlib.sha256(f"{ip}|{user_agent}|{time_bucket}".encode('utf-8')).hexdigest()[:32]
+        return f"anon_{digest}"
 
-    def update_log_event_to_api(self, event_data):
+    def record_event_to_api(self, event_data):
         """
-        更新日志到日志 API
+        将完整的日志记录放入后台发送队列，由后台线程批量写入
         """
-        try:
-            log_id = event_data.get('id')
-            if log_id:
-                response = requests.patch(f"{settings.LOGS_API_URL}/api/customUser/event-logs/{log_id}/", json=event_data)
-                if response.status_code == 200:
-                    logger.info(f"Log successfully updated to API with ID: {log_id}")
-                else:
-                    logger.error(f"Failed to update log to API: {response.status_code} {response.text}")
-            else:
-                logger.error("No log ID found in event data. Cannot update log.")
-        except Exception as e:
-            logger.error(f"Error updating log to API: {str(e)}")
+        if not get_shipper().enqueue('record', dict(event_data)):
+            logger.debug("Event log queue is full, log dropped")
+
+    def log_event_to_api(self, event_data, handle):
+        """
+        将日志放入后台发送队列，不阻塞当前请求
+        """
+        if not get_shipper().enqueue('create', dict(event_data), handle):
+            logger.debug("Event log queue is full, log dropped")
+
+    def update_log_event_to_api(self, event_data, handle):
+        """
+        将日志更新放入后台发送队列，不阻塞当前请求
+        """
+        if not get_shipper().enqueue('update', dict(event_data), handle):
+            logger.debug("Event log queue is full, log update dropped")
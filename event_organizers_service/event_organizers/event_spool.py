@@ -0,0 +1,175 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.ndjson'
+OPEN_SUFFIX = '.ndjson.open'
+CLAIMED_MARKER = '.replaying-'
+
+
+class EventSpool:
+    """
+    Append-only on-disk spool for event logs that could not be shipped.
+
+    Events are written as NDJSON into segment files of at most ``segment_max_bytes``;
+    each ``append`` call is one write + one fsync, so fsyncs are batched per shipper
+    batch rather than per event. When the spool grows beyond ``max_total_bytes`` the
+    oldest segments are deleted. ``drain`` replays closed segments oldest first and
+    deletes each one once it has been delivered; events carry an ``event_id``, so a
+    segment that is replayed twice after a crash does not duplicate rows.
+
+    Several gunicorn workers may share one directory: segment names contain the PID,
+    and a segment is claimed for replay with an atomic rename.
+    """
+
+    def __init__(self, directory, segment_max_bytes=4 * 1024 * 1024, max_total_bytes=256 * 1024 * 1024,
+                 fsync=True):
+        self.directory = str(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.fsync = fsync
+        self.discarded = 0
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_path = None
+        self._sequence = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def append(self, records):
+        """
+        Durably append a batch of event dicts.
+        """
+        if not records:
+            return
+        data = ''.join(json.dumps(record, default=str) + '\n' for record in records).encode('utf-8')
+        with self._lock:
+            segment = self._open_segment()
+            segment.write(data)
+            segment.flush()
+            if self.fsync:
+                os.fsync(segment.fileno())
+            if segment.tell() >= self.segment_max_bytes:
+                self._close_segment()
+        self._enforce_limit()
+
+    def drain(self, send, chunk_size=500):
+        """
+        Replay spooled events through ``send(records) -> bool``.
+        Stops at the first failed send and returns the number of events delivered.
+        """
+        with self._lock:
+            # 当前正在写入的段也一起回放
+            self._close_segment()
+
+        delivered = 0
+        for path in self._replayable_segments():
+            claimed = self._claim(path)
+            if claimed is None:
+                continue
+            records = self._read_segment(claimed)
+            for start in range(0, len(records), chunk_size):
+                chunk = records[start:start + chunk_size]
+                if not send(chunk):
+                    # 释放认领，下次继续回放该段
+                    os.rename(claimed, self._unclaimed_path(claimed))
+                    return delivered
+                delivered += len(chunk)
+            os.remove(claimed)
+        return delivered
+
+    def has_pending(self):
+        return self._segment is not None or bool(self._replayable_segments())
+
+    def size(self):
+        return sum(os.path.getsize(path) for path in self._all_segments())
+
+    def _open_segment(self):
+        if self._segment is None:
+            self._sequence += 1
+            name = f"segment-{time.time_ns()}-{os.getpid()}-{self._sequence}{OPEN_SUFFIX}"
+            self._segment_path = os.path.join(self.directory, name)
+            self._segment = open(self._segment_path, 'ab')
+        return self._segment
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+        self._segment.close()
+        # 去掉 .open 后缀，表示该段已写完，可以回放
+        os.rename(self._segment_path, self._segment_path[:-len(OPEN_SUFFIX)] + SEGMENT_SUFFIX)
+        self._segment = None
+        self._segment_path = None
+
+    def _all_segments(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(os.path.join(self.directory, name) for name in names if name.startswith('segment-'))
+
+    def _replayable_segments(self):
+        segments = []
+        for path in self._all_segments():
+            if path.endswith(SEGMENT_SUFFIX):
+                segments.append(path)
+            elif CLAIMED_MARKER in path and not self._pid_alive(path.rsplit(CLAIMED_MARKER, 1)[1]):
+                # 回放中途退出的进程留下的段，重新回放
+                segments.append(path)
+            elif path.endswith(OPEN_SUFFIX) and path != self._segment_path:
+                # 写入中途退出的进程留下的段
+                pid = os.path.basename(path).split('-')[2]
+                if pid != str(os.getpid()) and not self._pid_alive(pid):
+                    segments.append(path)
+        return segments
+
+    def _claim(self, path):
+        # rename 是原子的，多个进程同时回放时只有一个能认领成功
+        target = f"{self._unclaimed_path(path)}{CLAIMED_MARKER}{os.getpid()}"
+        try:
+            os.rename(path, target)
+        except FileNotFoundError:
+            return None
+        return target
+
+    @staticmethod
+    def _unclaimed_path(path):
+        return path.split(CLAIMED_MARKER)[0]
+
+    @staticmethod
+    def _pid_alive(pid):
+        try:
+            os.kill(int(pid), 0)
+        except (ValueError, ProcessLookupError):
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @staticmethod
+    def _read_segment(path):
+        records = []
+        with open(path, 'rb') as segment:
+            for line in segment:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 进程崩溃时可能留下不完整的最后一行
+                    logger.warning(f"Skipping corrupt line in event log spool segment {path}")
+        return records
+
+    def _enforce_limit(self):
+        segments = [path for path in self._all_segments() if path.endswith(SEGMENT_SUFFIX)]
+        total = self.size()
+        while total > self.max_total_bytes and segments:
+            oldest = segments.pop(0)
+            try:
+                total -= os.path.getsize(oldest)
+                os.remove(oldest)
+            except FileNotFoundError:
+                continue
+            self.discarded += 1
+            logger.warning(f"Event log spool is over {self.max_total_bytes} bytes, discarded segment {oldest}")
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.10 on 2026-10-17 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event_organizers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventpromotion',
+            index=models.Index(fields=['event', 'promotion_start_date', 'promotion_end_date'], name='promotion_event_dates_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venuebooking',
+            index=models.Index(fields=['user_id', 'booking_date'], name='venuebooking_user_date_idx'),
+        ),
+    ]
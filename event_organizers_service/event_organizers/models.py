@@ -27,6 +27,12 @@ class VenueBooking(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
 
+    class Meta:
+        # Per-user booking list
+        indexes = [
+            models.Index(fields=['user_id', 'booking_date'], name='venuebooking_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"Booking for {self.event_id.name}"
 
@@ -61,5 +67,11 @@ class EventPromotion(models.Model):
     promotion_end_date = models.DateField()
     discount = models.DecimalField(max_digits=5, decimal_places=2)
 
+    class Meta:
+        # Active promotion lookup in calculate-price
+        indexes = [
+            models.Index(fields=['event', 'promotion_start_date', 'promotion_end_date'], name='promotion_event_dates_idx'),
+        ]
+
     def __str__(self):
         return f"Promotion for {self.event.name}"
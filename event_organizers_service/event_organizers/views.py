@@ -9,6 +9,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from .permissions import IsAdminOrReadOnly
 from .responses import CustomResponse
+from .circuit_breaker import breaker_snapshots
 from .models import (Event, VenueBooking, EventPromotion)
 from .serializers import (EventSerializer, VenueBookingSerializer,
                           EventPromotionSerializer, EventBookingCalculatePriceSerializer)
@@ -129,4 +130,5 @@ class HealthView(APIView):
     )
     
     def get(self, request):
-        return Response({"status": "ok"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        # 附带熔断器状态和触发次数，便于监控对 auth_service 的依赖
+        return Response({"status": "ok", "circuit_breakers": breaker_snapshots()}, status=status.HTTP_200_OK)
\ No newline at end of file
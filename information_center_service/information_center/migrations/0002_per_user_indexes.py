@@ -0,0 +1,17 @@
+# Generated by Django 3.2.10 on 2026-10-17 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('information_center', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tourbooking',
+            index=models.Index(fields=['user_id', 'tour_id'], name='tourbooking_user_tour_idx'),
+        ),
+    ]
@@ -36,6 +36,14 @@ class TourBooking(models.Model):
     booking_status = models.BooleanField(default=False)
     payment_status = models.BooleanField(default=False)
 
+    class Meta:
+        # Per-user booking list. Unlike the other booking models there is no date column here:
+        # the date is Tour.tour_date, which an index on this table cannot cover, so the
+        # per-user lookup is paired with the tour join column instead.
+        indexes = [
+            models.Index(fields=['user_id', 'tour_id'], name='tourbooking_user_tour_idx'),
+        ]
+
 
 class EventNotification(models.Model):
     title = models.CharField(max_length=255)
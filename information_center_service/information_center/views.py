@@ -6,6 +6,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from .auth_backend import JWTAuthBackend
+from .circuit_breaker import breaker_snapshots
 from .models import Destination, Tour, EventNotification, TourBooking
 from .serializers import DestinationSerializer, TourSerializer, \
     EventNotificationSerializer, TourBookingSerializer
@@ -68,4 +69,5 @@ class HealthView(APIView):
     )
     
     def get(self, request):
-        return Response({"status": "ok"}, status=status.HTTP_200_OK)
+        # 附带熔断器状态和触发次数，便于监控对 auth_service 的依赖
+        return Response({"status": "ok", "circuit_breakers": breaker_snapshots()}, status=status.HTTP_200_OK)
@@ -1,17 +1,41 @@
 import logging
-import requests
 from django.contrib.auth import get_user_model
+from requests.exceptions import RequestException
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.conf import settings
 from rest_framework_simplejwt.tokens import AccessToken
 from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from . import http_client
+from .circuit_breaker import get_breaker
+from .user_cache import get_user_cache, user_cache_key
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
 class JWTAuthBackend(JWTAuthentication):
     def authenticate(self, request):
+        """
+        同一个请求只认证一次：日志中间件和 DRF 认证共享保存在 HttpRequest 上的结果，
+        避免重复验签、重复请求 auth_service 和重复写用户表
+        """
+        http_request = getattr(request, '_request', request)
+        cached = getattr(http_request, '_jwt_auth_result', None)
+        if cached is not None:
+            result, error = cached
+            if error is not None:
+                raise error
+            return result
+
+        try:
+            result = self._authenticate(request)
+        except AuthenticationFailed as e:
+            http_request._jwt_auth_result = (None, e)
+            raise
+        http_request._jwt_auth_result = (result, None)
+        return result
+
+    def _authenticate(self, request):
         try:
             header = self.get_header(request)
             if header is None:
@@ -37,18 +61,54 @@ class JWTAuthBackend(JWTAuthentication):
             raise AuthenticationFailed(str(e))
 
     def get_user(self, validated_token):
+        # claims 模式：直接用 Token 中的声明构建用户，不请求 auth_service 也不写数据库
+        if getattr(settings, 'JWT_AUTH_MODE', 'remote') == 'claims':
+            claims_user_data = self.user_data_from_claims(validated_token)
+            if claims_user_data is not None:
+                if not claims_user_data['is_active']:
+                    raise AuthenticationFailed('用户已被禁用')
+                return self.build_user(claims_user_data)
+            logger.debug("Token does not carry all user claims, falling back to remote lookup")
+
         try:
             user_id = validated_token['user_id']
             logger.debug(f"Attempting to get user info for user_id: {user_id}")
             
             # 确保这个 URL 路径与您的认证服务 API 匹配
+            # 先查本地用户缓存，命中时跳过对 auth_service 的请求和数据库写入
+            user_cache = get_user_cache()
+            cache_key = user_cache_key(validated_token) if user_cache else None
+            if user_cache:
+                cached_user_data = user_cache.get(cache_key)
+                if cached_user_data is not None:
+                    return self.build_user(cached_user_data)
+
             url = f"{settings.USER_SERVICE_URL}/api/customUser/me/"
             logger.debug(f"Requesting user info from: {url}")
             
-            response = requests.get(
-                url,
-                headers={'Authorization': f"Bearer {validated_token}"}
-            )
+            # auth_service 熔断或不可用时走降级逻辑，避免 worker 堆积在远程调用上
+            breaker = get_breaker('user_service')
+            if not breaker.allow_request():
+                return self.get_fallback_user(validated_token, user_cache, cache_key)
+            try:
+                # 读超时不重试：auth_service 挂起时请求线程最多等待一次读超时
+                response = http_client.get(
+                    url,
+                    headers={'Authorization': f"Bearer {validated_token}"},
+                    retry_reads=False,
+                )
+            except RequestException as e:
+                breaker.record_failure()
+                logger.warning(f'请求 auth_service 失败: {str(e)}')
+                return self.get_fallback_user(validated_token, user_cache, cache_key)
+            except Exception:
+                # 其他异常同样结束半开试探，避免熔断器一直卡在半开状态
+                breaker.record_failure()
+                raise
+            if response.status_code >= 500:
+                breaker.record_failure()
+                return self.get_fallback_user(validated_token, user_cache, cache_key)
+            breaker.record_success()
             # logger.debug(f"Response status: {response.status_code}")
             # logger.debug(f"Response content: {response.text}")
             
@@ -65,6 +125,14 @@ class JWTAuthBackend(JWTAuthentication):
                     }
                 )
                 logger.debug(f"User {'created' if created else 'updated'}: {user}")
+                if user_cache:
+                    user_cache.set(cache_key, {
+                        'id': user_data['id'],
+                        'email': user_data['email'],
+                        'name': user_data['name'],
+                        'is_staff': user_data['is_staff'],
+                        'is_active': user_data['is_active'],
+                    })
                 return user
             else:
                 raise AuthenticationFailed(f'无法验证用户: {response.status_code} - {response.text}')
@@ -72,6 +140,51 @@ class JWTAuthBackend(JWTAuthentication):
             logger.error(f'获取用户信息时出错: {str(e)}')
             raise AuthenticationFailed(f'获取用户信息时出错: {str(e)}')
 
+    def get_fallback_user(self, validated_token, user_cache, cache_key):
+        """
+        auth_service 熔断或请求失败时的降级：按 USER_SERVICE_FALLBACKS 依次尝试
+        （可能已过期的）缓存用户和 Token 声明，都不可用时认证失败
+        """
+        for fallback in getattr(settings, 'USER_SERVICE_FALLBACKS', ('cache', 'claims')):
+            if fallback == 'cache' and user_cache:
+                user_data = user_cache.get(cache_key, allow_stale=True)
+                if user_data is not None:
+                    return self.build_user(user_data)
+            elif fallback == 'claims':
+                user_data = self.user_data_from_claims(validated_token)
+                if user_data is not None and user_data['is_active']:
+                    return self.build_user(user_data)
+        raise AuthenticationFailed('认证服务暂时不可用')
+
+    @staticmethod
+    def user_data_from_claims(validated_token):
+        """
+        从 Token 声明中提取用户数据，旧 Token 缺少声明时返回 None
+        """
+        claims = ('user_id', 'email', 'name', 'is_staff', 'is_active')
+        if any(claim not in validated_token for claim in claims):
+            return None
+        return {
+            'id': validated_token['user_id'],
+            'email': validated_token['email'],
+            'name': validated_token['name'],
+            'is_staff': validated_token['is_staff'],
+            'is_active': validated_token['is_active'],
+        }
+
+    @staticmethod
+    def build_user(user_data):
+        """
+        根据缓存或 Token 声明中的用户数据构建未保存的用户对象，不访问数据库
+        """
+        return User(
+            id=user_data['id'],
+            email=user_data['email'],
+            username=user_data['name'],
+            is_staff=user_data['is_staff'],
+            is_active=user_data['is_active'],
+        )
+
 class JWTAuthenticationScheme(OpenApiAuthenticationExtension):
     target_class = 'local_transportation.auth_backend.JWTAuthBackend'
     name = 'JWTAuth'
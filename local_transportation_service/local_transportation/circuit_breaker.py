@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around a remote dependency.
+
+    closed: calls go through; ``failure_threshold`` consecutive failures open the breaker.
+    open: calls are rejected immediately for ``recovery_timeout`` seconds.
+    half_open: up to ``half_open_max_calls`` trial calls are let through; a success
+    closes the breaker again, a failure re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.trip_count = 0
+        self.rejected_count = 0
+        self.opened_at = None
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == STATE_OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    self.rejected_count += 1
+                    return False
+                self.state = STATE_HALF_OPEN
+                self._half_open_calls = 0
+                logger.info(f"Circuit breaker '{self.name}' is half-open, probing dependency")
+
+            if self.state == STATE_HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self.rejected_count += 1
+                    return False
+                self._half_open_calls += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                logger.info(f"Circuit breaker '{self.name}' closed")
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    self.trip_count += 1
+                    logger.warning(f"Circuit breaker '{self.name}' opened after "
+                                   f"{self.consecutive_failures} consecutive failures")
+                self.state = STATE_OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trip_count': self.trip_count,
+                'rejected_count': self.rejected_count,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """
+    Return the process-wide breaker for ``name``, creating it from settings on first use.
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    name,
+                    failure_threshold=getattr(settings, 'CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5),
+                    recovery_timeout=getattr(settings, 'CIRCUIT_BREAKER_RECOVERY_TIMEOUT', 30.0),
+                    half_open_max_calls=getattr(settings, 'CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS', 1),
+                )
+                _breakers[name] = breaker
+    return breaker
+
+
+def breaker_snapshots():
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
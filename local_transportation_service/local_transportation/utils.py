@@ -3,6 +3,7 @@ import consul
 import os
 import requests
 from requests.exceptions import RequestException
+from .http_client import get_session
 
 def register_service():
     max_retries = 5
@@ -12,6 +13,8 @@ def register_service():
         try:
             consul_host = os.environ.get('CONSUL_HOST', 'consul')
             consul_client = consul.Consul(host=consul_host)
+            # 使用带超时和连接池的共享 session，避免 Consul 不可用时注册请求无限挂起
+            consul_client.http.session = get_session()
 
             service_host = os.environ.get('SERVICE_HOST', 'local-transportation-service')
             service_port = int(os.environ.get('SERVICE_PORT', 8000))
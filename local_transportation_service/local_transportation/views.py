@@ -7,6 +7,7 @@ from rest_framework.views import APIView
 from rest_framework import status
 
 from .auth_backend import JWTAuthBackend
+from .circuit_breaker import breaker_snapshots
 from .models import TransportationProvider, RideBooking, RoutePlanning, TrafficUpdate
 from .serializers import TransportationServiceSerializer, RideBookingSerializer, \
     RoutePlanningSerializer, TrafficUpdateSerializer
@@ -59,4 +60,5 @@ class HealthView(APIView):
     )
     
     def get(self, request):
-        return Response({"status": "ok"}, status=status.HTTP_200_OK)    
\ No newline at end of file
+        # 附带熔断器状态和触发次数，便于监控对 auth_service 的依赖
+        return Response({"status": "ok", "circuit_breakers": breaker_snapshots()}, status=status.HTTP_200_OK)    
\ No newline at end of file
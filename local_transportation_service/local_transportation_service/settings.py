@@ -150,6 +150,65 @@ SIMPLE_JWT = {
 USER_SERVICE_URL = os.environ.get('USER_SERVICE_URL', 'http://auth-service:8003')
 LOGS_API_URL = os.environ.get('LOGS_API_URL', 'http://auth-service:8003')
 
+# 事件日志后台发送配置
+EVENT_LOG_QUEUE_SIZE = int(os.environ.get('EVENT_LOG_QUEUE_SIZE', 10000))  # 内存队列最大长度
+EVENT_LOG_BATCH_SIZE = int(os.environ.get('EVENT_LOG_BATCH_SIZE', 100))  # 每批最多发送的事件数
+EVENT_LOG_FLUSH_INTERVAL = float(os.environ.get('EVENT_LOG_FLUSH_INTERVAL', 1.0))  # 凑批最长等待秒数
+# 队列满时的处理方式: drop_newest / drop_oldest / block
+EVENT_LOG_OVERFLOW_POLICY = os.environ.get('EVENT_LOG_OVERFLOW_POLICY', 'drop_newest')
+# 单次写入模式：响应结束后发送完整日志，而不是先 POST 再 PATCH
+EVENT_LOG_SINGLE_WRITE = os.environ.get('EVENT_LOG_SINGLE_WRITE', 'True') == 'True'
+EVENT_LOG_SERVICE_NAME = os.environ.get('EVENT_LOG_SERVICE_NAME', 'local_transportation')  # 写入事件日志的服务名，用于按服务汇总
+
+# 远程用户信息缓存（TTL + LRU），命中时跳过 /me/ 请求和本地用户表写入
+USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'True') == 'True'
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))  # 秒
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', 1024))  # 每个进程最多缓存的用户数
+USER_CACHE_KEY = os.environ.get('USER_CACHE_KEY', 'user_id')  # user_id 或 jti
+# 可选的共享缓存（如 django_redis.cache.RedisCache 或 django.core.cache.backends.filebased.FileBasedCache）
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+USER_CACHE_ALIAS = None
+if os.environ.get('USER_CACHE_BACKEND'):
+    CACHES['users'] = {
+        'BACKEND': os.environ['USER_CACHE_BACKEND'],
+        'LOCATION': os.environ.get('USER_CACHE_LOCATION', ''),
+    }
+    USER_CACHE_ALIAS = 'users'
+
+# 认证模式: remote 每次请求 auth_service 获取用户; claims 直接使用 Token 中的用户声明
+JWT_AUTH_MODE = os.environ.get('JWT_AUTH_MODE', 'remote')
+
+# 匿名请求的 case ID：签名 cookie 名称、有效期以及 IP + User-Agent 哈希的时间窗口（秒）
+CASE_ID_COOKIE_NAME = 'case_id'
+CASE_ID_COOKIE_MAX_AGE = int(os.environ.get('CASE_ID_COOKIE_MAX_AGE', 1800))
+CASE_ID_TIME_BUCKET = int(os.environ.get('CASE_ID_TIME_BUCKET', 1800))
+
+# 服务间 HTTP 调用：每个 gunicorn worker 共享一个带连接池和 keep-alive 的 session
+INTER_SERVICE_CONNECT_TIMEOUT = float(os.environ.get('INTER_SERVICE_CONNECT_TIMEOUT', 2.0))  # 秒
+INTER_SERVICE_READ_TIMEOUT = float(os.environ.get('INTER_SERVICE_READ_TIMEOUT', 5.0))  # 秒
+INTER_SERVICE_POOL_SIZE = int(os.environ.get('INTER_SERVICE_POOL_SIZE', 10))
+INTER_SERVICE_MAX_RETRIES = int(os.environ.get('INTER_SERVICE_MAX_RETRIES', 2))
+INTER_SERVICE_BACKOFF_FACTOR = float(os.environ.get('INTER_SERVICE_BACKOFF_FACTOR', 0.2))
+
+# auth_service 熔断器配置（USER_SERVICE_URL 和 LOGS_API_URL 各一个）
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD', 5))  # 连续失败多少次后熔断
+CIRCUIT_BREAKER_RECOVERY_TIMEOUT = float(os.environ.get('CIRCUIT_BREAKER_RECOVERY_TIMEOUT', 30.0))  # 熔断后多少秒进入半开
+CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS = int(os.environ.get('CIRCUIT_BREAKER_HALF_OPEN_MAX_CALLS', 1))  # 半开状态允许的试探请求数
+# auth_service 不可用时获取用户的降级顺序: cache（可能过期的缓存用户）、claims（Token 声明）
+USER_SERVICE_FALLBACKS = ('cache', 'claims')
+
+# 日志 API 不可用时的降级方式: spool（写入本地磁盘，恢复后回放）或 drop（直接丢弃）
+LOGS_BREAKER_FALLBACK = os.environ.get('LOGS_BREAKER_FALLBACK', 'spool')
+EVENT_LOG_SPOOL_DIR = os.environ.get('EVENT_LOG_SPOOL_DIR', os.path.join(BASE_DIR, 'event_log_spool'))
+EVENT_LOG_SPOOL_SEGMENT_BYTES = int(os.environ.get('EVENT_LOG_SPOOL_SEGMENT_BYTES', 4 * 1024 * 1024))  # 单个段文件大小上限
+EVENT_LOG_SPOOL_MAX_BYTES = int(os.environ.get('EVENT_LOG_SPOOL_MAX_BYTES', 256 * 1024 * 1024))  # 磁盘占用上限，超出后丢弃最旧的段
+EVENT_LOG_SPOOL_FSYNC = os.environ.get('EVENT_LOG_SPOOL_FSYNC', 'True') == 'True'  # 每批写入后 fsync
+EVENT_LOG_SPOOL_REPLAY_INTERVAL = float(os.environ.get('EVENT_LOG_SPOOL_REPLAY_INTERVAL', 10.0))  # 回放检查间隔秒数
+
 # 添加认证后端
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',  # 保留默认的后台认证机制
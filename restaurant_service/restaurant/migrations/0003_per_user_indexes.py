@@ -0,0 +1,21 @@
+# Generated by Django 3.2.10 on 2026-10-17 08:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0002_menu_onlineorder_restaurant_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='onlineorder',
+            index=models.Index(fields=['user_id', 'order_date'], name='onlineorder_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tablereservation',
+            index=models.Index(fields=['user_id', 'reservation_date'], name='reservation_user_date_idx'),
+        ),
+    ]
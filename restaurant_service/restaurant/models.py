@@ -21,6 +21,12 @@ class TableReservation(models.Model):
     number_of_guests = models.PositiveIntegerField()
     reservation_status = models.CharField(max_length=255)
 
+    class Meta:
+        # Per-user reservation list
+        indexes = [
+            models.Index(fields=['user_id', 'reservation_date'], name='reservation_user_date_idx'),
+        ]
+
     def __str__(self):
         return self.restaurant.name
 
@@ -43,6 +49,12 @@ class OnlineOrder(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     order_status = models.CharField(max_length=255)
 
+    class Meta:
+        # Per-user order list
+        indexes = [
+            models.Index(fields=['user_id', 'order_date'], name='onlineorder_user_date_idx'),
+        ]
+
     def __str__(self):
         return self.restaurant.name
 